@@ -0,0 +1,42 @@
+import threading
+from collections import deque, defaultdict
+
+
+class LatencyTracker:
+    """
+    Thread-safe rolling window of latencies (ms) per label, e.g. per
+    retrieval path or provider. Exposes counts and percentiles for /metrics.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.counts = defaultdict(int)
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self, label: str, ms: float):
+        with self._lock:
+            self.counts[label] += 1
+            self._samples[label].append(ms)
+
+    def percentile(self, label: str, pct: float):
+        with self._lock:
+            samples = sorted(self._samples.get(label, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct))]
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = {label: sorted(samples) for label, samples in self._samples.items()}
+            counts = dict(self.counts)
+
+        result = {}
+        for label, samples in snapshot.items():
+            result[label] = {
+                "count": counts[label],
+                "avg_ms": round(sum(samples) / len(samples), 2) if samples else 0.0,
+                "p50_ms": round(samples[len(samples) // 2], 2) if samples else 0.0,
+                "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2) if samples else 0.0,
+            }
+        return result
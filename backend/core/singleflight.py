@@ -0,0 +1,119 @@
+import asyncio
+from collections import defaultdict
+
+
+class _Flight:
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        # Streams: chunks produced so far, replayed to callers that join late
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.signal = asyncio.Event()
+
+    def notify(self):
+        signal, self.signal = self.signal, asyncio.Event()
+        signal.set()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent async calls within one event loop. The
+    first caller for a key starts the upstream call; callers arriving while
+    it runs wait for the same result (or the same stream of chunks) instead
+    of starting their own. A key is forgotten as soon as its call finishes,
+    so nothing is served after the fact; that is what the caches are for.
+    The upstream call is cancelled only when every caller has gone away.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self.coalesced_by_label = defaultdict(int)
+        self._flights = {}
+
+    def _join(self, key):
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            self.calls += 1
+            created = True
+        else:
+            self.coalesced += 1
+            self.coalesced_by_label[key[0]] += 1
+            created = False
+        flight.waiters += 1
+        return flight, created
+
+    def _finish(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _leave(self, flight):
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
+
+    async def do(self, key: tuple, fn):
+        """
+        Returns the result of `fn()`, shared with concurrent callers of `key`.
+        key[0] labels the call in the metrics.
+        """
+        flight, created = self._join(key)
+        if created:
+            flight.task = asyncio.ensure_future(fn())
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+            # Mark the exception retrieved even if every caller left
+            flight.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(flight)
+
+    async def stream(self, key: tuple, fn):
+        """
+        Yields the chunks of the async iterator `fn()`, shared with concurrent
+        callers of `key`; a caller that joins late gets every chunk from the start.
+        """
+        flight, created = self._join(key)
+        if created:
+            flight.task = asyncio.ensure_future(self._pump(key, flight, fn))
+        try:
+            position = 0
+            while True:
+                signal = flight.signal
+                while position < len(flight.chunks):
+                    yield flight.chunks[position]
+                    position += 1
+                if flight.done and position == len(flight.chunks):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await signal.wait()
+        finally:
+            self._leave(flight)
+
+    async def _pump(self, key, flight, fn):
+        chunks = fn()
+        try:
+            async for chunk in chunks:
+                flight.chunks.append(chunk)
+                flight.notify()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            self._finish(key, flight)
+            flight.done = True
+            flight.notify()
+            await chunks.aclose()
+
+    def stats(self) -> dict:
+        total = self.calls + self.coalesced
+        return {
+            "upstream_calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / total, 4) if total else 0.0,
+            "coalesced_by_operation": dict(self.coalesced_by_label),
+            "in_flight": len(self._flights),
+        }
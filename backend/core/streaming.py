@@ -0,0 +1,63 @@
+import json
+import time
+from fastapi.responses import StreamingResponse
+from core.metrics import LatencyTracker
+
+# Request start to first streamed token, per endpoint
+stream_ttft = LatencyTracker()
+
+NDJSON_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # keep reverse proxies from buffering the stream
+}
+
+
+def _line(event: dict) -> bytes:
+    return (json.dumps(event, default=str) + "\n").encode("utf-8")
+
+
+async def _encode(events, label: str, started: float):
+    """
+    One JSON object per line: {"type": "token", "text": ...} while generating,
+    then {"type": "done", ...} with the final payload (plus ttft_ms), or
+    {"type": "error", "detail": ...} if generation fails after the stream began.
+    """
+    ttft_ms = None
+    try:
+        async for event in events:
+            if event["type"] == "token" and ttft_ms is None:
+                ttft_ms = round((time.perf_counter() - started) * 1000, 2)
+                stream_ttft.record(label, ttft_ms)
+            if event["type"] == "done":
+                event = {**event, "ttft_ms": ttft_ms}
+            yield _line(event)
+    except Exception as e:
+        print(f"Stream Error ({label}): {e}")
+        yield _line({"type": "error", "detail": getattr(e, "detail", None) or str(e)})
+
+
+async def _prepend(first: dict, events):
+    if first is not None:
+        yield first
+    async for event in events:
+        yield event
+
+
+async def ndjson_response(events, label: str, started: float = None) -> StreamingResponse:
+    """
+    Streams an async iterator of event dicts as NDJSON. `started` is when the
+    request began (defaults to now), so time to first token covers any work
+    done before streaming, like retrieval. The first event is awaited before
+    the response starts, so failures before any output (rate limits, no
+    provider available) still return their HTTP status.
+    """
+    started = started or time.perf_counter()
+    try:
+        first = await events.__anext__()
+    except StopAsyncIteration:
+        first = None
+    return StreamingResponse(
+        _encode(_prepend(first, events), label, started),
+        media_type="application/x-ndjson",
+        headers=NDJSON_HEADERS
+    )
@@ -1,7 +1,11 @@
 import os
-from fastapi import FastAPI
+import math
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from database import engine, Base
+from services.llm_provider import LLMError, LLMTimeoutError, ProviderUnavailable
+from services.rate_limiter import RateLimitExceeded
 
 from models.user_model import User
 from models.ai_responses import AIResponse
@@ -9,11 +13,14 @@ from models.quiz_model import QuizModel
 from models.question_model import Question
 from models.pdf_model import UserPDF
 from models.user_quiz_responses import UserQuizResponse 
+from models.chunk_embedding_model import ChunkEmbedding
+from models.tutor_cache_model import TutorCacheEntry
 # ----------------------------------------
 
 from routes.auth_routes import router as auth_router
 from routes.tutor_routes import router as tutor_router
 from routes.pdf_routes import router as pdf_router
+from routes.metrics_routes import router as metrics_router
 
 # Create Tables
 Base.metadata.create_all(bind=engine)
@@ -29,9 +36,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# LLM failures map to gateway errors instead of a generic 500
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))}
+    )
+
+@app.exception_handler(LLMError)
+async def llm_error_handler(request: Request, exc: LLMError):
+    return JSONResponse(status_code=status.HTTP_502_BAD_GATEWAY, content={"detail": str(exc)})
+
+@app.exception_handler(LLMTimeoutError)
+async def llm_timeout_handler(request: Request, exc: LLMTimeoutError):
+    return JSONResponse(status_code=status.HTTP_504_GATEWAY_TIMEOUT, content={"detail": str(exc)})
+
+@app.exception_handler(ProviderUnavailable)
+async def provider_unavailable_handler(request: Request, exc: ProviderUnavailable):
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": str(exc)})
+
 app.include_router(auth_router)
 app.include_router(tutor_router)
 app.include_router(pdf_router)
+app.include_router(metrics_router)
 
 @app.get("/")
 def read_root():
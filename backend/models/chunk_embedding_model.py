@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime
+from sqlalchemy.sql import func
+from database import Base
+
+
+class ChunkEmbedding(Base):
+    __tablename__ = "chunk_embeddings"
+
+    # sha256(model name + chunk text), shared across users and documents
+    key = Column(String(64), primary_key=True)
+
+    model = Column(String, nullable=False)
+
+    dimension = Column(Integer, nullable=False)
+
+    # float32 little-endian bytes
+    vector = Column(LargeBinary, nullable=False)
+
+    created_at = Column(DateTime(timezone=True),
+                        server_default=func.now())
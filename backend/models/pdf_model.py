@@ -1,8 +1,15 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey
 from sqlalchemy.sql import func
 from database import Base
 import uuid
 
+# Ingestion job states
+PDF_STATUS_QUEUED = "queued"
+PDF_STATUS_EXTRACTING = "extracting"
+PDF_STATUS_EMBEDDING = "embedding"
+PDF_STATUS_INDEXED = "indexed"
+PDF_STATUS_FAILED = "failed"
+
 class UserPDF(Base):
     __tablename__ = "user_pdfs"
 
@@ -11,4 +18,23 @@ class UserPDF(Base):
     filename = Column(String, nullable=False)
     file_url = Column(String, nullable=True) # Optional: if you store file in S3/Local
     pinecone_namespace = Column(String, nullable=False) 
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+
+    # Content-addressed dedup: identical bytes + embedding model share one namespace
+    content_hash = Column(String(64), nullable=True, index=True)
+    embedding_model = Column(String, nullable=True)
+
+    # JSON list of [content hash, chunk count] per page, for incremental re-ingestion
+    page_hashes = Column(Text, nullable=True)
+
+    # Estimated LLM tokens of the extracted text (small documents are answered from the full text)
+    token_count = Column(Integer, nullable=True)
+
+    # Background ingestion progress
+    status = Column(String, nullable=False, default=PDF_STATUS_QUEUED)
+    pages_total = Column(Integer, nullable=True)
+    pages_processed = Column(Integer, nullable=False, default=0)
+    chunks_processed = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -2,6 +2,11 @@ from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
 from sqlalchemy.sql import func
 from database import Base
 
+# Quiz generation states (quizzes are generated after the answer is returned)
+QUIZ_STATUS_PENDING = "pending"
+QUIZ_STATUS_READY = "ready"
+QUIZ_STATUS_FAILED = "failed"
+
 
 class QuizModel(Base):
     __tablename__ = "quizzes"
@@ -12,5 +17,9 @@ class QuizModel(Base):
 
     created_by = Column(String, ForeignKey("users.id"))
 
+    status = Column(String, nullable=False, default=QUIZ_STATUS_READY)
+
+    error = Column(Text, nullable=True)
+
     created_at = Column(DateTime(timezone=True),
                         server_default=func.now())
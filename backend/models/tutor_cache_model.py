@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, Text, LargeBinary, DateTime, ForeignKey
+from database import Base
+
+
+class TutorCacheEntry(Base):
+    __tablename__ = "tutor_response_cache"
+
+    id = Column(String, primary_key=True)
+
+    # sha256 of the normalised question, for exact lookups
+    question_key = Column(String(64), nullable=False, index=True)
+
+    normalized_question = Column(Text, nullable=False)
+
+    # Question embedding (float32 little-endian bytes) and the model that produced it
+    embedding_model = Column(String, nullable=False)
+    vector = Column(LargeBinary, nullable=False)
+
+    # JSON tutor response: question, answer, topic, field, quiz
+    response = Column(Text, nullable=False)
+
+    # Quiz saved for the first asker, reused by later hits
+    quiz_id = Column(String, ForeignKey("quizzes.id"), nullable=True)
+
+    provider = Column(String, nullable=True)
+
+    # Completion tokens of the response, i.e. what each hit saves
+    response_tokens = Column(Integer, nullable=False, default=0)
+
+    hits = Column(Integer, nullable=False, default=0)
+
+    # Set from Python (UTC) so TTL and LRU cut-offs compare the same way on every database
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    last_used_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, status
+from services.rag_service import query_embedding_cache, query_embedder, chat_latency
+from services.answer_cache import answer_cache
+from services.tutor_cache import tutor_cache
+from services.llm_provider import ttft_latency, get_provider
+from core.streaming import stream_ttft
+from core.security import get_current_user
+from models.user_model import User
+
+router = APIRouter()
+
+@router.get("/metrics", status_code=status.HTTP_200_OK)
+async def get_metrics(current_user: User = Depends(get_current_user)):
+    """
+    In-process counters for caches and batching, used to size them (signed-in users only).
+    """
+    return {
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "query_embedding_batcher": query_embedder.stats(),
+        "answer_cache": answer_cache.stats(),
+        "tutor_cache": tutor_cache.stats(),
+        "pdf_chat_latency": chat_latency.stats(),
+        "llm_ttft": ttft_latency.stats(),
+        "llm_router": get_provider().stats(),
+        "llm_single_flight": get_provider().single_flight.stats(),
+        "stream_ttft": stream_ttft.stats(),
+    }
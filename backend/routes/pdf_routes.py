@@ -1,71 +1,258 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
+from fastapi import APIRouter, Request, Depends, HTTPException, status, BackgroundTasks
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException
 from sqlalchemy.orm import Session
 from database import get_db
 from core.security import get_current_user
+from core.streaming import ndjson_response
 from models.user_model import User
-from models.pdf_model import UserPDF
-from services.rag_service import process_pdf, query_rag
-import shutil
+from models.pdf_model import (
+    UserPDF, PDF_STATUS_QUEUED, PDF_STATUS_EXTRACTING, PDF_STATUS_EMBEDDING, PDF_STATUS_INDEXED, PDF_STATUS_FAILED
+)
+from services.rag_service import (
+    retrieve_chunks, retrieve_library, format_context, embed_query, chat_latency,
+    EMBEDDING_VERSION, ADAPTIVE_CONTEXT, FULL_CONTEXT_MAX_TOKENS
+)
+from services.chunk_store import get_document_text
+from services.answer_cache import answer_cache, ANSWER_CACHE_ENABLED
+from services.ingestion_service import run_ingestion, release_namespace
+from services.upload_store import read_upload_form, store_upload, object_path, UploadTooLarge, NotAPdf
 import os
+import json
+import time
 import uuid
 from pydantic import BaseModel
 
-# from services.ollama_service import ask_pdf_tutor
-# from services.gemini_service import ask_pdf_tutor
-from services.groq_service import ask_pdf_tutor
+# AI providers (groq, gemini and ollama, in LLM_PROVIDERS order with failover)
+from services.llm_provider import get_provider
 
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 class PDFChatRequest(BaseModel):
     pdf_id: str
     question: str
 
-@router.post("/pdf/upload", status_code=status.HTTP_201_CREATED)
+class LibraryChatRequest(BaseModel):
+    question: str
+
+def pdf_status_payload(pdf: UserPDF) -> dict:
+    return {
+        "pdf_id": pdf.id,
+        "filename": pdf.filename,
+        "status": pdf.status,
+        "pages_total": pdf.pages_total,
+        "pages_processed": pdf.pages_processed,
+        "chunks_processed": pdf.chunks_processed,
+        "error": pdf.error,
+    }
+
+def find_indexed_source(db: Session, content_hash: str):
+    """
+    An upload with the same bytes, indexed (or being indexed) with the current model.
+    """
+    return db.query(UserPDF).filter(
+        UserPDF.content_hash == content_hash,
+        UserPDF.embedding_model == EMBEDDING_VERSION,
+        UserPDF.status != PDF_STATUS_FAILED
+    ).order_by(UserPDF.created_at).first()
+
+def share_index(pdf: UserPDF, source: UserPDF):
+    pdf.pinecone_namespace = source.pinecone_namespace
+    pdf.status = source.status
+    pdf.pages_total = source.pages_total
+    pdf.pages_processed = source.pages_processed
+    pdf.chunks_processed = source.chunks_processed
+    pdf.page_hashes = source.page_hashes
+    pdf.token_count = source.token_count
+
+def replace_pdf(db: Session, background_tasks: BackgroundTasks, pdf: UserPDF, content_hash: str, file_path: str, page_count: int = None):
+    """
+    Replace mode: re-ingests a new version of an existing upload. When the namespace
+    belongs to this upload alone, only pages whose content hash changed are re-embedded.
+    A namespace shared with deduplicated uploads is never modified; the new version goes
+    to a fresh namespace and unchanged chunks come from the embedding cache.
+    """
+    if pdf.content_hash == content_hash and pdf.status != PDF_STATUS_FAILED:
+        return {"message": "PDF unchanged", **pdf_status_payload(pdf)}
+
+    old_hash = pdf.content_hash
+    old_namespace = pdf.pinecone_namespace
+    # The previous version's job may still be reading its file and writing its namespace
+    in_progress = pdf.status in (PDF_STATUS_QUEUED, PDF_STATUS_EXTRACTING, PDF_STATUS_EMBEDDING)
+    shared = db.query(UserPDF).filter(
+        UserPDF.pinecone_namespace == pdf.pinecone_namespace,
+        UserPDF.id != pdf.id
+    ).count() > 0
+    can_patch = (
+        not shared
+        and pdf.status == PDF_STATUS_INDEXED
+        and pdf.embedding_model == EMBEDDING_VERSION
+        and pdf.page_hashes is not None
+    )
+    source = find_indexed_source(db, content_hash)
+
+    pdf.content_hash = content_hash
+    pdf.file_url = file_path
+    pdf.embedding_model = EMBEDDING_VERSION
+    pdf.error = None
+
+    previous_pages = None
+    if source:
+        share_index(pdf, source)
+        message = "Identical PDF already uploaded, reusing its index"
+    else:
+        if can_patch:
+            previous_pages = json.loads(pdf.page_hashes)
+        else:
+            pdf.pinecone_namespace = f"{pdf.user_id}_{uuid.uuid4()}"
+        pdf.status = PDF_STATUS_QUEUED
+        pdf.pages_total = page_count
+        pdf.pages_processed = 0
+        pdf.chunks_processed = 0
+        message = "PDF queued for re-processing"
+    db.commit()
+
+    # Drop the previous version's bytes once nothing points at them
+    # (a job still in progress does this itself when it finds it was replaced)
+    if old_hash and old_hash != content_hash and not in_progress:
+        if not db.query(UserPDF).filter(UserPDF.content_hash == old_hash).first():
+            old_path = object_path(old_hash)
+            if os.path.exists(old_path):
+                os.remove(old_path)
+
+    if not source:
+        background_tasks.add_task(run_ingestion, pdf.id, file_path, pdf.pinecone_namespace, previous_pages)
+
+    # The previous version's index is unreachable once no row uses its namespace;
+    # a job still writing to it discards it again when it finishes
+    if old_namespace and old_namespace != pdf.pinecone_namespace:
+        background_tasks.add_task(release_namespace, old_namespace)
+
+    return {"message": message, **pdf_status_payload(pdf)}
+
+@router.post("/pdf/upload", status_code=status.HTTP_202_ACCEPTED)
 async def upload_pdf(
-    file: UploadFile = File(...), 
+    request: Request,
+    background_tasks: BackgroundTasks,
+    mode: str = "new",
     db: Session = Depends(get_db), 
     current_user: User = Depends(get_current_user)
 ):
-    # Check if file exists for user 
-    existing = db.query(UserPDF).filter(UserPDF.user_id == current_user.id, UserPDF.filename == file.filename).first()
-    if existing:
-        return {"message": "File already exists", "pdf_id": existing.id}
+    """
+    Multipart upload with the PDF in the "file" field. The body is parsed here
+    rather than by File(...), so oversized uploads are refused before they reach disk.
+    """
+    if mode not in ("new", "replace"):
+        raise HTTPException(400, "mode must be 'new' or 'replace'")
 
-    # Save locally
-    file_id = str(uuid.uuid4())
-    file_path = f"{UPLOAD_DIR}/{file_id}_{file.filename}"
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    try:
+        form = await read_upload_form(request)
+    except UploadTooLarge as e:
+        raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, str(e))
+    except MultiPartException as e:
+        raise HTTPException(400, e.message)
 
-    # Process RAG (Namespace = UserID_FileID to keep unique)
-    namespace = f"{current_user.id}_{file_id}"
     try:
-        process_pdf(file_path, namespace)
-    except Exception as e:
-        os.remove(file_path) # Cleanup on failure
-        raise HTTPException(500, f"Error processing PDF: {str(e)}")
+        file = form.get("file")
+        if not isinstance(file, UploadFile) or not file.filename:
+            raise HTTPException(422, "A PDF file is required in the 'file' field")
+        filename = file.filename
+
+        # Check if file exists for user 
+        existing = db.query(UserPDF).filter(UserPDF.user_id == current_user.id, UserPDF.filename == filename).first()
+        if existing and mode != "replace":
+            return {"message": "File already exists", **pdf_status_payload(existing)}
+
+        # Stream into the content-addressed store; hash and page count come from the same pass
+        try:
+            content_hash, file_path, page_count = await store_upload(file)
+        except UploadTooLarge as e:
+            raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, str(e))
+        except NotAPdf as e:
+            raise HTTPException(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, str(e))
+    finally:
+        await form.close()
+
+    if existing:
+        return replace_pdf(db, background_tasks, existing, content_hash, file_path, page_count)
+
+    # Same bytes already indexed (or being indexed) with the current model: reuse its vectors
+    file_id = str(uuid.uuid4())
+    source = find_indexed_source(db, content_hash)
 
-    # Save to DB
     new_pdf = UserPDF(
         id=file_id,
         user_id=current_user.id,
-        filename=file.filename,
-        pinecone_namespace=namespace
+        filename=filename,
+        file_url=file_path,
+        content_hash=content_hash,
+        embedding_model=EMBEDDING_VERSION,
+        # Namespace = UserID_FileID of the first upload of these bytes
+        pinecone_namespace=f"{current_user.id}_{file_id}",
+        status=PDF_STATUS_QUEUED,
+        pages_total=page_count
     )
+    if source:
+        share_index(new_pdf, source)
     db.add(new_pdf)
     db.commit()
+
+    if source:
+        # Ingestion already done or in flight for this namespace; nothing to process
+        return {"message": "Identical PDF already uploaded, reusing its index", **pdf_status_payload(new_pdf)}
+
+    # Process RAG after the response is sent (runs in the threadpool)
+    background_tasks.add_task(run_ingestion, file_id, file_path, new_pdf.pinecone_namespace)
     
-    return {"message": "PDF processed successfully", "pdf_id": file_id}
+    return {"message": "PDF queued for processing", **pdf_status_payload(new_pdf)}
+
+@router.get("/pdf/status/{pdf_id}", status_code=status.HTTP_200_OK)
+async def pdf_status(pdf_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    pdf = db.query(UserPDF).filter(UserPDF.id == pdf_id, UserPDF.user_id == current_user.id).first()
+    if not pdf:
+        raise HTTPException(404, "PDF not found")
+    return pdf_status_payload(pdf)
 
 @router.get("/pdf/list", status_code=status.HTTP_200_OK)
 async def list_pdfs(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     pdfs = db.query(UserPDF).filter(UserPDF.user_id == current_user.id).all()
-    return [{"id": p.id, "filename": p.filename, "created_at": p.created_at} for p in pdfs]
+    return [{"id": p.id, "filename": p.filename, "status": p.status, "created_at": p.created_at} for p in pdfs]
+
+def get_chat_pdf(db: Session, pdf_id: str, user_id: str) -> UserPDF:
+    pdf = db.query(UserPDF).filter(UserPDF.id == pdf_id, UserPDF.user_id == user_id).first()
+    if not pdf:
+        raise HTTPException(404, "PDF not found")
+    if pdf.status != PDF_STATUS_INDEXED:
+        raise HTTPException(409, f"PDF is not ready yet (status: {pdf.status})")
+    return pdf
+
+async def load_pdf_context(pdf: UserPDF, question: str, version: str):
+    """
+    Context for a question as (context, hits, mode): the whole text of small
+    documents ("full_context"), retrieved chunks otherwise ("rag").
+    """
+    context = None
+    if ADAPTIVE_CONTEXT and pdf.token_count is not None and pdf.token_count <= FULL_CONTEXT_MAX_TOKENS:
+        context = await run_in_threadpool(get_document_text, pdf.pinecone_namespace)
+    if context is not None:
+        return context, [], "full_context"
+
+    # Retrieve Context (in the threadpool, so concurrent chats share embedding batches)
+    hits = await run_in_threadpool(retrieve_chunks, question, pdf.pinecone_namespace, version=version)
+    return format_context(hits), hits, "rag"
+
+def record_chat_latency(pdf_id: str, mode: str, started: float, retrieved: float, finished: float) -> dict:
+    latency = {
+        "retrieval_ms": round((retrieved - started) * 1000, 2),
+        "llm_ms": round((finished - retrieved) * 1000, 2),
+        "total_ms": round((finished - started) * 1000, 2),
+    }
+    chat_latency.record(mode, latency["total_ms"])
+    chat_latency.record(f"{mode}.retrieval", latency["retrieval_ms"])
+    print(f"PDF chat ({pdf_id}): {mode}, retrieval {latency['retrieval_ms']} ms, total {latency['total_ms']} ms")
+    return latency
 
 @router.post("/pdf/chat", status_code=status.HTTP_200_OK)
 async def chat_pdf(
@@ -73,14 +260,131 @@ async def chat_pdf(
     db: Session = Depends(get_db), 
     current_user: User = Depends(get_current_user)
 ):
-    pdf = db.query(UserPDF).filter(UserPDF.id == req.pdf_id, UserPDF.user_id == current_user.id).first()
-    if not pdf:
-        raise HTTPException(404, "PDF not found")
+    pdf = get_chat_pdf(db, req.pdf_id, current_user.id)
     
-    # Retrieve Context from Pinecone
-    context = query_rag(req.question, pdf.pinecone_namespace)
+    # Near-identical question on the same document version: reuse the answer
+    version = pdf.embedding_model or EMBEDDING_VERSION
+    scope = (pdf.pinecone_namespace, pdf.content_hash or pdf.id, version)
+    if ANSWER_CACHE_ENABLED:
+        query_emb = await run_in_threadpool(embed_query, req.question, version)
+        cached = answer_cache.get(scope, query_emb)
+        if cached:
+            response, similarity = cached
+            return {**response, "cached": True, "cache_similarity": round(similarity, 4)}
+
+    # Small documents fit the prompt whole: skip retrieval and send the full text
+    started = time.perf_counter()
+    context, hits, mode = await load_pdf_context(pdf, req.question, version)
+    retrieved = time.perf_counter()
     
     # 2. Ask LLM with Context
-    answer = ask_pdf_tutor(req.question, context)
+    answer = await get_provider().ask_pdf_tutor(req.question, context)
+    finished = time.perf_counter()
     
-    return {"answer": answer, "context_used": context}
\ No newline at end of file
+    response = {
+        "answer": answer,
+        "context_used": context,
+        "citations": [{"chunk_id": hit["chunk_id"], "page": hit["page"]} for hit in hits],
+        "retrieval_mode": mode,
+        "context_tokens": pdf.token_count if mode == "full_context" else sum(hit.get("tokens", 0) for hit in hits),
+        "latency_ms": record_chat_latency(pdf.id, mode, started, retrieved, finished)
+    }
+    if ANSWER_CACHE_ENABLED:
+        answer_cache.set(scope, query_emb, response)
+    return {**response, "cached": False}
+
+@router.post("/pdf/chat/stream", status_code=status.HTTP_200_OK)
+async def chat_pdf_stream(
+    req: PDFChatRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    NDJSON version of /pdf/chat: answer tokens as they are generated, then
+    "done" with the same payload (citations, retrieval_mode, latency_ms, cached).
+    """
+    started = time.perf_counter()
+    pdf = get_chat_pdf(db, req.pdf_id, current_user.id)
+
+    version = pdf.embedding_model or EMBEDDING_VERSION
+    scope = (pdf.pinecone_namespace, pdf.content_hash or pdf.id, version)
+    if ANSWER_CACHE_ENABLED:
+        query_emb = await run_in_threadpool(embed_query, req.question, version)
+        cached = answer_cache.get(scope, query_emb)
+        if cached:
+            response, similarity = cached
+
+            async def replay():
+                yield {"type": "token", "text": response["answer"]}
+                yield {"type": "done", **response, "cached": True, "cache_similarity": round(similarity, 4)}
+
+            return await ndjson_response(replay(), "pdf_chat", started)
+
+    # Retrieval runs before the stream starts, so its errors keep their status codes
+    context, hits, mode = await load_pdf_context(pdf, req.question, version)
+    retrieved = time.perf_counter()
+    pdf_id = pdf.id
+    context_tokens = pdf.token_count if mode == "full_context" else sum(hit.get("tokens", 0) for hit in hits)
+    provider = get_provider()
+
+    async def events():
+        parts = []
+        async for text in provider.stream_pdf_tutor(req.question, context):
+            parts.append(text)
+            yield {"type": "token", "text": text}
+        finished = time.perf_counter()
+
+        response = {
+            "answer": "".join(parts),
+            "context_used": context,
+            "citations": [{"chunk_id": hit["chunk_id"], "page": hit["page"]} for hit in hits],
+            "retrieval_mode": mode,
+            "context_tokens": context_tokens,
+            "latency_ms": record_chat_latency(pdf_id, mode, started, retrieved, finished)
+        }
+        if ANSWER_CACHE_ENABLED:
+            answer_cache.set(scope, query_emb, response)
+        yield {"type": "done", **response, "cached": False}
+
+    return await ndjson_response(events(), "pdf_chat", started)
+
+@router.post("/pdf/library/chat", status_code=status.HTTP_200_OK)
+async def chat_library(
+    req: LibraryChatRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    pdfs = db.query(UserPDF).filter(
+        UserPDF.user_id == current_user.id,
+        UserPDF.status == PDF_STATUS_INDEXED
+    ).order_by(UserPDF.created_at).all()
+    if not pdfs:
+        raise HTTPException(404, "No indexed PDFs in your library")
+
+    # Deduplicated uploads share a namespace; attribute it to the first of them
+    owners = {}
+    for pdf in pdfs:
+        owners.setdefault(pdf.pinecone_namespace, pdf)
+
+    # Every document is searched concurrently with one query embedding
+    namespaces = {namespace: pdf.embedding_model or EMBEDDING_VERSION for namespace, pdf in owners.items()}
+    hits = await run_in_threadpool(retrieve_library, req.question, namespaces)
+    for hit in hits:
+        hit["source"] = owners[hit["namespace"]].filename
+    context = format_context(hits)
+
+    answer = await get_provider().ask_pdf_tutor(req.question, context)
+
+    return {
+        "answer": answer,
+        "context_used": context,
+        "citations": [
+            {
+                "pdf_id": owners[hit["namespace"]].id,
+                "filename": hit["source"],
+                "chunk_id": hit["chunk_id"],
+                "page": hit["page"]
+            }
+            for hit in hits
+        ]
+    }
@@ -2,7 +2,7 @@ from fastapi import Body
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
@@ -12,19 +12,26 @@ from models.user_model import User
 from models.question_model import Question
 from models.ai_responses import AIResponse
 
-from models.quiz_model import QuizModel
+from models.quiz_model import QuizModel, QUIZ_STATUS_PENDING, QUIZ_STATUS_READY
 from models.question_model import Question
 from models.ai_responses import AIResponse
 from models.user_quiz_responses import UserQuizResponse
 from schemas.quiz_schema import Quiz
 from schemas.question_schema import Question as QuestionSchema
-from database import get_db
+from database import get_db, SessionLocal
+from core.streaming import ndjson_response
+
+
+# AI providers (groq, gemini and ollama, in LLM_PROVIDERS order with failover)
+from services.llm_provider import get_provider, LLMError
+from services.rate_limiter import RateLimitExceeded
+from starlette.concurrency import run_in_threadpool
 
+# Cache of earlier tutor answers
+from services.tutor_cache import tutor_cache, TUTOR_CACHE_ENABLED, TUTOR_CACHE_REUSE_QUIZ
 
-# AI services (uncomment the one you want to use)
-# from services.gemini_service import ask_tutor, ask_quick_tutor, analyze_student_performance
-# from services.ollama_service import ask_tutor, ask_quick_tutor, analyze_student_performance
-from services.groq_service import ask_tutor, ask_quick_tutor, analyze_student_performance
+# Quizzes are generated in the background, after the answer is returned
+from services.quiz_service import build_quiz, create_quiz, add_questions, provisional_topic
 
 # text to speech service
 from services.tts_service import generate_audio
@@ -35,52 +42,38 @@ router = APIRouter()
 class TutorRequest(BaseModel):
     question: str
 
-@router.post("/ask-tutor", status_code=status.HTTP_200_OK)
-async def ask_tutor_route(request: TutorRequest, db:Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-
-    response = ask_tutor(request.question)
-    quiz_data = response.get("quiz")
-    new_quiz=QuizModel(
-        id=str(uuid.uuid4()),
-        topic=response.get("topic"),
-        created_by=current_user.id
-    )
-
+def save_quiz(db: Session, user_id: str, response: dict) -> str:
+    """
+    Persists the generated quiz and its questions; returns the quiz id.
+    """
     try:
-        db.add(new_quiz)
+        new_quiz = create_quiz(db, user_id, response.get("topic"))
+        add_questions(db, new_quiz.id, response.get("quiz") or {})
         db.commit()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error saving quiz: {str(e)}")
+    return new_quiz.id
 
-    for question in quiz_data.keys():
-        new_question=Question(
-            id=str(uuid.uuid4()),
-            quiz_id=new_quiz.id,
-            question_number=question,
-            question_text=quiz_data[question]["question"],
-            option_1=quiz_data[question]["options"]["1"],
-            option_2=quiz_data[question]["options"]["2"],
-            option_3=quiz_data[question]["options"]["3"],
-            option_4=quiz_data[question]["options"]["4"],
-            correct_option=int(quiz_data[question]["answer"]) if isinstance(quiz_data[question]["answer"], str) else quiz_data[question]["answer"],
-            difficulty=quiz_data[question]["difficulty"]
-        )
-
-        try:
-            db.add(new_question)
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(status_code=500, detail=f"Error saving question: {str(e)}")
-
-    db.commit()
+def save_pending_quiz(db: Session, user_id: str, topic: str) -> str:
+    """
+    Persists an empty quiz that build_quiz fills in the background; returns the quiz id.
+    """
+    try:
+        new_quiz = create_quiz(db, user_id, topic, status=QUIZ_STATUS_PENDING)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error saving quiz: {str(e)}")
+    return new_quiz.id
 
+def save_ai_response(db: Session, user_id: str, question: str, response: dict, quiz_id: str) -> AIResponse:
     # ai response model
     ai_response = AIResponse(
         id=str(uuid.uuid4()),
-        user_id=current_user.id,
-        quiz_id=new_quiz.id,
-        user_question=request.question,
+        user_id=user_id,
+        quiz_id=quiz_id,
+        user_question=question,
         topic=response.get("topic"),
         answer_text=response.get("answer")
     )
@@ -92,17 +85,116 @@ async def ask_tutor_route(request: TutorRequest, db:Session = Depends(get_db), c
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error saving AI response: {str(e)}")
 
+    return ai_response
+
+def save_tutor_response(db: Session, user_id: str, question: str, response: dict, quiz_id: str = None) -> AIResponse:
+    """
+    Persists the answer and its quiz (a new copy unless `quiz_id` reuses a saved one).
+    """
+    if quiz_id is None:
+        quiz_id = save_quiz(db, user_id, response)
+    return save_ai_response(db, user_id, question, response, quiz_id)
+
+def save_answer_only(db: Session, user_id: str, question: str, response: dict) -> AIResponse:
+    """
+    Persists an answer whose quiz is still to be generated (status "pending").
+    """
+    topic = response.get("topic") or provisional_topic(question)
+    quiz_id = save_pending_quiz(db, user_id, topic)
+    return save_ai_response(db, user_id, question, {**response, "topic": topic}, quiz_id)
+
+def lookup_cached_tutor_response(question: str):
+    """
+    Cached answer to this (or a near-identical) question as (response, quiz_id, cache fields), or None.
+    """
+    if not TUTOR_CACHE_ENABLED:
+        return None
+    hit = tutor_cache.lookup(question)
+    if hit is None:
+        return None
+    response = {**hit["response"], "question": question}
+    quiz_id = hit["quiz_id"] if TUTOR_CACHE_REUSE_QUIZ else None
+    return response, quiz_id, {"cached": True, "cache_match": hit["match"], "cache_similarity": hit["similarity"]}
+
+def tutor_payload(user_id: str, response_id: str, response: dict, quiz_status: str = QUIZ_STATUS_READY) -> dict:
     return {
         "message": "Tutor response generated and saved successfully",
-        "user_id": current_user.id,
-        "response_id": ai_response.id,
+        "user_id": user_id,
+        "response_id": response_id,
         "question": response.get("question"),
         "answer": response.get("answer"),
         "topic": response.get("topic"),
         "field": response.get("field"),
-        "quiz": quiz_data,
+        "quiz": response.get("quiz"),
+        "quiz_status": quiz_status,
     }
 
+@router.post("/ask-tutor", status_code=status.HTTP_200_OK)
+async def ask_tutor_route(request: TutorRequest, background_tasks: BackgroundTasks, db:Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    Returns the answer as soon as it is written; the quiz is generated in the
+    background ("quiz_status": "pending" until GET /quiz/{response_id} reports it ready).
+    """
+
+    # Asked before (exactly or nearly): reuse the stored answer and quiz
+    cached = await run_in_threadpool(lookup_cached_tutor_response, request.question)
+    if cached:
+        response, quiz_id, cache_info = cached
+        ai_response = save_tutor_response(db, current_user.id, request.question, response, quiz_id)
+        return {**tutor_payload(current_user.id, ai_response.id, response), **cache_info}
+
+    response = await get_provider().ask_tutor_answer(request.question)
+    response = {**response, "question": request.question}
+    ai_response = save_answer_only(db, current_user.id, request.question, response)
+    background_tasks.add_task(build_quiz, ai_response.quiz_id, request.question, response)
+    return {**tutor_payload(current_user.id, ai_response.id, response, QUIZ_STATUS_PENDING), "cached": False}
+
+@router.post("/ask-tutor/stream", status_code=status.HTTP_200_OK)
+async def ask_tutor_stream_route(request: TutorRequest, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user)):
+    """
+    NDJSON stream of the answer tokens, then "done" with the same payload as
+    /ask-tutor once the answer is saved; the quiz is generated after the stream ends.
+    """
+    user_id = current_user.id
+    provider = get_provider()
+
+    def persist(save, *args) -> AIResponse:
+        # Own session: the stream outlives the request's dependencies
+        db = SessionLocal()
+        try:
+            ai_response = save(db, user_id, request.question, *args)
+            db.refresh(ai_response)
+            db.expunge(ai_response)
+            return ai_response
+        finally:
+            db.close()
+
+    cached = await run_in_threadpool(lookup_cached_tutor_response, request.question)
+    if cached:
+        response, quiz_id, cache_info = cached
+
+        async def replay():
+            yield {"type": "token", "text": response["answer"]}
+            ai_response = await run_in_threadpool(persist, save_tutor_response, response, quiz_id)
+            yield {"type": "done", **tutor_payload(user_id, ai_response.id, response), **cache_info}
+
+        return await ndjson_response(replay(), "ask_tutor")
+
+    async def events():
+        parts = []
+        async for text in provider.stream_tutor_answer(request.question):
+            parts.append(text)
+            yield {"type": "token", "text": text}
+
+        response = {"question": request.question, "answer": "".join(parts)}
+        ai_response = await run_in_threadpool(persist, save_answer_only, response)
+        response["topic"] = ai_response.topic
+        # Runs once the response has been sent
+        background_tasks.add_task(build_quiz, ai_response.quiz_id, request.question, response, update_topic=True)
+        yield {"type": "done", **tutor_payload(user_id, ai_response.id, response, QUIZ_STATUS_PENDING), "cached": False}
+
+    return await ndjson_response(events(), "ask_tutor")
+
 @router.get("/response/{response_id}", status_code=status.HTTP_200_OK)
 async def get_response_detail(
     response_id: str, 
@@ -132,9 +224,10 @@ async def get_quiz(response_id: str, db: Session = Depends(get_db)):
 
     response=db.query(AIResponse).filter(AIResponse.id == response_id).first()
 
-    quiz_id = response.quiz_id
+    if not response:
+        raise HTTPException(status_code=404, detail="Response not found")
 
-    quiz=db.query(QuizModel).filter(QuizModel.id == quiz_id).first()
+    quiz_id = response.quiz_id
 
     if not quiz_id:
         raise HTTPException(status_code=404, detail="Quiz not found")
@@ -152,7 +245,9 @@ async def get_quiz(response_id: str, db: Session = Depends(get_db)):
         user_id=response.user_id,
         response_id=response_id,  
         question_ids=[q.id for q in questions],
-        topic=quiz.topic
+        topic=quiz.topic,
+        status=quiz.status or QUIZ_STATUS_READY,
+        error=quiz.error
     )
 
     return quiz_data
@@ -196,15 +291,35 @@ async def get_user_topics(db: Session = Depends(get_db), current_user: User = De
 @router.post("/ask-quick", status_code=status.HTTP_200_OK)
 async def ask_quick_route(request: TutorRequest):
 
-    text_answer = ask_quick_tutor(request.question)
+    text_answer = await get_provider().ask_quick_tutor(request.question)
     print(f"Generated Text Answer: {text_answer}")
-    audio_data = generate_audio(text_answer)
+    # gTTS is a blocking HTTP call
+    audio_data = await run_in_threadpool(generate_audio, text_answer)
     
     return {
         "answer": text_answer,
         "audio": audio_data  # Send Base64 audio string
     }
 
+@router.post("/ask-quick/stream", status_code=status.HTTP_200_OK)
+async def ask_quick_stream_route(request: TutorRequest):
+    """
+    NDJSON stream of the answer text; "done" carries the full answer and its audio.
+    """
+    provider = get_provider()
+
+    async def events():
+        parts = []
+        async for text in provider.stream_quick_tutor(request.question):
+            parts.append(text)
+            yield {"type": "token", "text": text}
+
+        text_answer = "".join(parts)
+        audio_data = await run_in_threadpool(generate_audio, text_answer)
+        yield {"type": "done", "answer": text_answer, "audio": audio_data}
+
+    return await ndjson_response(events(), "ask_quick")
+
 @router.post("/quiz/submit", status_code=status.HTTP_200_OK)
 async def submit_quiz(
     data: dict = Body(...),
@@ -295,7 +410,16 @@ async def get_user_summary(
         history_text += f"Topic: {quiz.topic} | Question: {quest.question_text} | Status: {status}\n"
 
     # Sent to AI for analysis
-    analysis = analyze_student_performance(history_text)
+    try:
+        analysis = await get_provider().analyze_student_performance(history_text)
+    except (LLMError, RateLimitExceeded) as e:
+        print(f"Analysis Error: {e}")
+        analysis = {
+            "average_score": 0,
+            "strong_topics": [],
+            "weak_topics": [],
+            "advice": "Could not generate analysis at this time."
+        }
 
     return {
         "has_data": True,
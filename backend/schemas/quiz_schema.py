@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 
@@ -8,4 +8,6 @@ class Quiz(BaseModel):
     response_id: str
     question_ids: List[str]
     topic: str
+    status: str = "ready"
+    error: Optional[str] = None
 
@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+import itertools
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2048"))  # answers kept across all documents
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))  # seconds, 0 = never expire
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # min cosine to reuse an answer
+
+
+class SemanticAnswerCache:
+    """
+    Thread-safe cache of answers keyed by question embedding. Entries live in a
+    scope (namespace, document version); a lookup returns the closest cached
+    answer in the same scope when its cosine similarity reaches `threshold`.
+    Eviction is LRU over all scopes, with an optional TTL.
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._similarity_sum = 0.0
+        self._ids = itertools.count()
+        self._entries = OrderedDict()  # entry id -> (scope, stored_at, value), LRU order
+        self._scopes = {}              # scope -> {entry id: normalised vector}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalise(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _remove(self, entry_id: int):
+        scope, _, _ = self._entries.pop(entry_id)
+        vectors = self._scopes[scope]
+        del vectors[entry_id]
+        if not vectors:
+            del self._scopes[scope]
+
+    def get(self, scope: tuple, vector):
+        """
+        Returns (value, similarity) of the best match in `scope`, or None.
+        """
+        query = self._normalise(vector)
+        with self._lock:
+            vectors = self._scopes.get(scope)
+            if vectors and self.ttl:
+                now = time.monotonic()
+                for entry_id in [e for e in vectors if now - self._entries[e][1] >= self.ttl]:
+                    self._remove(entry_id)
+                vectors = self._scopes.get(scope)
+
+            if vectors:
+                entry_ids = list(vectors)
+                scores = np.stack([vectors[e] for e in entry_ids]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry_id = entry_ids[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    self._similarity_sum += float(scores[best])
+                    return self._entries[entry_id][2], float(scores[best])
+
+            self.misses += 1
+            return None
+
+    def set(self, scope: tuple, vector, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (scope, time.monotonic(), value)
+            self._scopes.setdefault(scope, {})[entry_id] = self._normalise(vector)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, namespace: str):
+        """
+        Drops every answer cached for a namespace (any document version).
+        """
+        with self._lock:
+            for scope in [s for s in self._scopes if s[0] == namespace]:
+                for entry_id in list(self._scopes[scope]):
+                    self._remove(entry_id)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "size": len(self._entries),
+            "documents": len(self._scopes),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "avg_hit_similarity": round(self._similarity_sum / self.hits, 4) if self.hits else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,239 @@
+import os
+import re
+import sys
+import math
+import time
+import pickle
+import shutil
+import tempfile
+from array import array
+import numpy as np
+from dotenv import load_dotenv
+from core.cache import LRUCache
+
+load_dotenv()
+
+# Configuration
+BM25_DIR = os.getenv("BM25_DIR", "bm25_index")
+BM25_CACHE_SIZE = int(os.getenv("BM25_CACHE_SIZE", "64"))  # loaded indexes kept in memory
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Keeps section numbers ("4.2"), formula names ("h2o", "e=mc") and hyphenated terms together
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-=][a-z0-9]+)*")
+
+os.makedirs(BM25_DIR, exist_ok=True)
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _index_path(namespace: str) -> str:
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in namespace)
+    return os.path.join(BM25_DIR, f"{safe}.bm25")
+
+
+class BM25Builder:
+    """
+    Builds a per-namespace inverted index while chunks stream through ingestion.
+    Postings are compact typed arrays: doc numbers (uint32) and term frequencies (uint16);
+    doc numbers map back to chunk ids through a single list.
+    """
+
+    def __init__(self):
+        self.chunk_ids = []
+        self.doc_lengths = array("I")
+        self.doc_ids = array("I")
+        self.postings = {}  # term -> (array("I") doc numbers, array("H") term frequencies)
+
+    def add(self, chunk_id: str, text: str):
+        counts = {}
+        for term in tokenize(text):
+            counts[term] = counts.get(term, 0) + 1
+
+        doc_id = len(self.chunk_ids)
+        self.chunk_ids.append(chunk_id)
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            docs, tfs = self.postings.setdefault(term, (array("I"), array("H")))
+            docs.append(doc_id)
+            tfs.append(min(tf, 65535))
+
+    def save(self, namespace: str):
+        data = {
+            "chunk_ids": self.chunk_ids,
+            "doc_ids": self.doc_ids.tobytes(),
+            "doc_lengths": self.doc_lengths.tobytes(),
+            "terms": {term: (docs.tobytes(), tfs.tobytes()) for term, (docs, tfs) in self.postings.items()},
+        }
+        path = _index_path(namespace)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)  # readers never see a half-written index
+        bm25_cache.pop(namespace)
+
+
+class BM25Index:
+    """
+    Read side of a saved index. Scoring is vectorised over each term's postings.
+    """
+
+    def __init__(self, data: dict):
+        doc_ids = np.frombuffer(data["doc_ids"], dtype=np.uint32)
+        lengths = np.frombuffer(data["doc_lengths"], dtype=np.uint32).astype(np.float32)
+        self.size = int(doc_ids.max()) + 1 if doc_ids.size else 0
+
+        # Dense doc-length table indexed by doc id
+        self.doc_lengths = np.zeros(self.size, dtype=np.float32)
+        self.doc_lengths[doc_ids] = lengths
+        self.doc_count = int(doc_ids.size)
+        self.avg_length = float(lengths.mean()) if lengths.size else 0.0
+        self.terms = data["terms"]
+        # Indexes built before chunk ids were stored used chunk_{doc number}
+        self.chunk_ids = data.get("chunk_ids") or [f"chunk_{i}" for i in range(self.size)]
+
+    @classmethod
+    def load(cls, namespace: str):
+        path = _index_path(namespace)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return cls(pickle.load(f))
+
+    def search(self, query: str, top_k: int = 10) -> list:
+        """
+        Returns [(chunk_id, score), ...] best first.
+        """
+        if not self.doc_count:
+            return []
+
+        scores = np.zeros(self.size, dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / max(self.avg_length, 1e-9))
+        for term in set(tokenize(query)):
+            posting = self.terms.get(term)
+            if posting is None:
+                continue
+            docs = np.frombuffer(posting[0], dtype=np.uint32)
+            tfs = np.frombuffer(posting[1], dtype=np.uint16).astype(np.float32)
+            idf = math.log(1 + (self.doc_count - docs.size + 0.5) / (docs.size + 0.5))
+            scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + norm[docs])
+
+        hits = np.flatnonzero(scores)
+        if not hits.size:
+            return []
+        k = min(top_k, hits.size)
+        best = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return [(self.chunk_ids[doc_id], float(scores[doc_id])) for doc_id in best]
+
+
+bm25_cache = LRUCache(max_size=BM25_CACHE_SIZE)
+
+
+def copy_index(source: str, target: str):
+    """
+    Copies a namespace's index (BM25 does not depend on the embedding model).
+    """
+    if os.path.exists(_index_path(source)):
+        shutil.copyfile(_index_path(source), f"{_index_path(target)}.tmp")
+        os.replace(f"{_index_path(target)}.tmp", _index_path(target))
+        bm25_cache.pop(target)
+
+
+def delete_index(namespace: str):
+    if os.path.exists(_index_path(namespace)):
+        os.remove(_index_path(namespace))
+    bm25_cache.pop(namespace)
+
+
+def search(namespace: str, query: str, top_k: int = 10) -> list:
+    """
+    BM25 search in a namespace. Documents indexed before BM25 existed return [].
+    """
+    index = bm25_cache.get(namespace)
+    if index is None:
+        index = BM25Index.load(namespace)
+        if index is None:
+            return []
+        bm25_cache.set(namespace, index)
+    return index.search(query, top_k)
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """
+    Fuses several best-first id lists; returns ids sorted by RRF score.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def benchmark(file_path: str, n_queries: int = 100) -> dict:
+    """
+    Build time and query latency of BM25 next to the dense path (encode + local vector store).
+    """
+    from services.rag_service import chunk_page, iter_pages, embed_model, EMBED_BATCH_SIZE
+    from services.vector_store import LocalVectorStore
+
+    chunks = [chunk for page_text in iter_pages(file_path) for chunk in chunk_page(page_text)]
+    namespace = "bench"
+
+    t = time.perf_counter()
+    builder = BM25Builder()
+    for i, chunk in enumerate(chunks):
+        builder.add(f"chunk_{i}", chunk)
+    builder.save(namespace)
+    bm25_build = time.perf_counter() - t
+
+    store = LocalVectorStore(tempfile.mkdtemp(prefix="bench_vectors_"))
+    t = time.perf_counter()
+    embeddings = embed_model.encode(chunks, batch_size=EMBED_BATCH_SIZE)
+    store.upsert([{"id": f"chunk_{i}", "values": e.tolist()} for i, e in enumerate(embeddings)], namespace)
+    dense_build = time.perf_counter() - t
+
+    # Queries made of a few words from random chunks
+    rng = np.random.default_rng(0)
+    queries = []
+    for _ in range(n_queries):
+        words = tokenize(chunks[int(rng.integers(len(chunks)))]) or ["empty"]
+        start = int(rng.integers(len(words)))
+        queries.append(" ".join(words[start:start + 4]))
+
+    bm25_ms, dense_ms = [], []
+    for query in queries:
+        t = time.perf_counter()
+        search(namespace, query)
+        bm25_ms.append((time.perf_counter() - t) * 1000)
+
+        t = time.perf_counter()
+        store.query(embed_model.encode(query).tolist(), namespace, top_k=10)
+        dense_ms.append((time.perf_counter() - t) * 1000)
+
+    os.remove(_index_path(namespace))
+    return {
+        "chunks": len(chunks),
+        "bm25_build_seconds": round(bm25_build, 3),
+        "dense_build_seconds": round(dense_build, 3),
+        "bm25_query_p50_ms": round(_percentile(bm25_ms, 0.5), 3),
+        "bm25_query_p95_ms": round(_percentile(bm25_ms, 0.95), 3),
+        "dense_query_p50_ms": round(_percentile(dense_ms, 0.5), 3),
+        "dense_query_p95_ms": round(_percentile(dense_ms, 0.95), 3),
+    }
+
+
+if __name__ == "__main__":
+    # Benchmark: python -m services.bm25_index path/to/file.pdf
+    if len(sys.argv) < 2:
+        print("Usage: python -m services.bm25_index <file.pdf>")
+        sys.exit(1)
+    print(benchmark(sys.argv[1]))
@@ -0,0 +1,198 @@
+import os
+import json
+import mmap
+import shutil
+import threading
+from dotenv import load_dotenv
+from core.cache import LRUCache
+
+load_dotenv()
+
+# Configuration
+CHUNK_STORE_DIR = os.getenv("CHUNK_STORE_DIR", "chunk_store")
+CHUNK_STORE_CACHE_SIZE = int(os.getenv("CHUNK_STORE_CACHE_SIZE", "128"))  # open documents kept mapped
+
+os.makedirs(CHUNK_STORE_DIR, exist_ok=True)
+
+
+def _paths(namespace: str) -> tuple:
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in namespace)
+    base = os.path.join(CHUNK_STORE_DIR, safe)
+    return f"{base}.blob", f"{base}.json"
+
+
+def _text_path(namespace: str) -> str:
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in namespace)
+    return os.path.join(CHUNK_STORE_DIR, f"{safe}.txt")
+
+
+class ChunkStoreWriter:
+    """
+    Streams chunk text of one document into a single UTF-8 blob and records
+    an offset table {chunk_id: [page, start, end]}. Files are swapped in
+    atomically on close(), so readers never see a partial document.
+    With append=True the existing blob is kept and new text is appended, so
+    offsets of untouched chunks (already stored in vector metadata) stay valid.
+    """
+
+    def __init__(self, namespace: str, append: bool = False):
+        self.namespace = namespace
+        self.blob_path, self.table_path = _paths(namespace)
+        self.table = {}
+
+        if append and os.path.exists(self.table_path):
+            shutil.copyfile(self.blob_path, f"{self.blob_path}.tmp")
+            with open(self.table_path, "r") as f:
+                self.table = json.load(f)["chunks"]
+            self._blob = open(f"{self.blob_path}.tmp", "ab")
+        else:
+            self._blob = open(f"{self.blob_path}.tmp", "wb")
+        self._offset = self._blob.tell()
+
+    def add(self, chunk_id: str, page: int, text: str) -> tuple:
+        """
+        Appends a chunk and returns its (start, end) byte offsets.
+        """
+        data = text.encode("utf-8")
+        start = self._offset
+        self._blob.write(data)
+        self._offset += len(data)
+        self.table[chunk_id] = [page, start, self._offset]
+        return start, self._offset
+
+    def remove(self, chunk_id: str):
+        self.table.pop(chunk_id, None)
+
+    def close(self):
+        self._blob.close()
+        with open(f"{self.table_path}.tmp", "w") as f:
+            json.dump({"chunks": self.table}, f)
+        os.replace(f"{self.blob_path}.tmp", self.blob_path)
+        os.replace(f"{self.table_path}.tmp", self.table_path)
+        chunk_store_cache.pop(self.namespace)
+
+    def abort(self):
+        self._blob.close()
+        if os.path.exists(f"{self.blob_path}.tmp"):
+            os.remove(f"{self.blob_path}.tmp")
+
+
+class ChunkStore:
+    """
+    Read side: the blob is memory-mapped and chunks are sliced out of it
+    through a memoryview, so no copy is made until the text is decoded.
+    """
+
+    def __init__(self, blob_path: str, table: dict):
+        self.table = table
+        self._file = open(blob_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._map) if self._map is not None else memoryview(b"")
+
+    @classmethod
+    def open(cls, namespace: str):
+        blob_path, table_path = _paths(namespace)
+        if not os.path.exists(table_path):
+            return None
+        with open(table_path, "r") as f:
+            table = json.load(f)["chunks"]
+        return cls(blob_path, table)
+
+    def read(self, start: int, end: int) -> str:
+        return str(self._view[start:end], "utf-8")
+
+    def get(self, chunk_id: str):
+        entry = self.table.get(chunk_id)
+        if entry is None:
+            return None
+        return self.read(entry[1], entry[2])
+
+    def page(self, chunk_id: str):
+        entry = self.table.get(chunk_id)
+        return entry[0] if entry else None
+
+    def close(self):
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+chunk_store_cache = LRUCache(max_size=CHUNK_STORE_CACHE_SIZE)
+document_text_cache = LRUCache(max_size=CHUNK_STORE_CACHE_SIZE)
+_open_lock = threading.Lock()
+
+
+def get_chunk_store(namespace: str):
+    """
+    Returns the mapped store for a namespace, or None for documents indexed
+    before the chunk store existed (their text still lives in vector metadata).
+    """
+    store = chunk_store_cache.get(namespace)
+    if store is None:
+        with _open_lock:
+            store = ChunkStore.open(namespace)
+            if store is not None:
+                chunk_store_cache.set(namespace, store)
+    return store
+
+
+def write_document_text(namespace: str, text: str = None):
+    """
+    Stores the full text of a small document for full-context answers;
+    None removes it (the document grew past the budget).
+    """
+    path = _text_path(namespace)
+    if text is None:
+        if os.path.exists(path):
+            os.remove(path)
+    else:
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(f"{path}.tmp", path)
+    document_text_cache.pop(namespace)
+
+
+def get_document_text(namespace: str):
+    text = document_text_cache.get(namespace)
+    if text is None:
+        path = _text_path(namespace)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        document_text_cache.set(namespace, text)
+    return text
+
+
+def copy_namespace(source: str, target: str) -> bool:
+    """
+    Copies a document's chunk text to another namespace (offsets stay valid).
+    Returns False when the source has no chunk store.
+    """
+    source_blob, source_table = _paths(source)
+    if not os.path.exists(source_table):
+        return False
+    target_blob, target_table = _paths(target)
+    shutil.copyfile(source_blob, f"{target_blob}.tmp")
+    shutil.copyfile(source_table, f"{target_table}.tmp")
+    os.replace(f"{target_blob}.tmp", target_blob)
+    os.replace(f"{target_table}.tmp", target_table)
+    chunk_store_cache.pop(target)
+    write_document_text(target, get_document_text(source))
+    return True
+
+
+def delete_namespace(namespace: str):
+    for path in _paths(namespace) + (_text_path(namespace),):
+        if os.path.exists(path):
+            os.remove(path)
+    chunk_store_cache.pop(namespace)
+    document_text_cache.pop(namespace)
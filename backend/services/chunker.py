@@ -0,0 +1,91 @@
+import os
+import re
+from dotenv import load_dotenv
+from services.token_utils import count_tokens, TOKEN_COUNTER
+
+load_dotenv()
+
+# Configuration
+CHUNK_TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", "180"))  # stays under MiniLM's 256-token input
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "30"))  # sentences repeated from the previous chunk
+
+# Changes whenever chunk boundaries would change, so page hashes of older ingests no longer match
+CHUNKER_VERSION = f"sentences:{CHUNK_TARGET_TOKENS}:{CHUNK_OVERLAP_TOKENS}:{TOKEN_COUNTER}"
+
+# Paragraph breaks, and sentence ends followed by something that starts a sentence
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?;:])\s+(?=[\"'(\[]?[A-Z0-9])")
+
+
+def split_sentences(text: str) -> list:
+    """
+    Splits text into whitespace-normalised sentences, paragraph by paragraph.
+    """
+    sentences = []
+    for paragraph in PARAGRAPH_PATTERN.split(text):
+        for sentence in SENTENCE_PATTERN.split(paragraph):
+            sentence = " ".join(sentence.split())
+            if sentence:
+                sentences.append(sentence)
+    return sentences
+
+
+def _split_long(sentence: str, max_tokens: int) -> list:
+    """
+    Breaks a sentence longer than a chunk at word boundaries.
+    """
+    parts = []
+    words = []
+    tokens = 0
+    for word in sentence.split(" "):
+        word_tokens = count_tokens(" " + word)
+        if words and tokens + word_tokens > max_tokens:
+            parts.append(" ".join(words))
+            words, tokens = [], 0
+        words.append(word)
+        tokens += word_tokens
+    if words:
+        parts.append(" ".join(words))
+    return parts
+
+
+def chunk_text(text: str, target_tokens: int = CHUNK_TARGET_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> list:
+    """
+    Packs whole sentences into chunks of at most `target_tokens`; each chunk
+    after the first starts with the trailing sentences (up to `overlap_tokens`)
+    of the previous one, so an idea cut at a boundary is still found whole.
+    """
+    # Run-on "sentences" (tables, lists without punctuation) are cut into overlap-sized
+    # pieces, so they still pack densely and can be carried into the next chunk
+    piece_tokens = min(overlap_tokens, target_tokens) if overlap_tokens > 0 else target_tokens
+    units = []
+    for sentence in split_sentences(text):
+        tokens = count_tokens(sentence)
+        if tokens > target_tokens:
+            units.extend((part, count_tokens(part)) for part in _split_long(sentence, piece_tokens))
+        else:
+            units.append((sentence, tokens))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        if current and current_tokens + unit[1] > target_tokens:
+            chunks.append(" ".join(sentence for sentence, _ in current))
+
+            # Carry the tail of the finished chunk, never all of it (always make progress)
+            carried = []
+            carried_tokens = 0
+            for sentence, tokens in reversed(current[1:]):
+                if carried_tokens + tokens > overlap_tokens or carried_tokens + tokens + unit[1] > target_tokens:
+                    break
+                carried.insert(0, (sentence, tokens))
+                carried_tokens += tokens
+            current, current_tokens = carried, carried_tokens
+
+        current.append(unit)
+        current_tokens += unit[1]
+
+    if current:
+        chunks.append(" ".join(sentence for sentence, _ in current))
+    return chunks
@@ -0,0 +1,82 @@
+import os
+import hashlib
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from models.chunk_embedding_model import ChunkEmbedding
+
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1") == "1"
+
+
+def chunk_key(text: str, model_name: str) -> str:
+    """
+    Content-hash key for a chunk embedding.
+    """
+    return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+class ChunkEmbeddingCache:
+    """
+    Persistent chunk -> embedding cache backed by the chunk_embeddings table.
+    Only chunks that miss the cache are sent to the encoder.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self.db = SessionLocal() if EMBED_CACHE_ENABLED else None
+
+    def encode(self, texts: list, encode_fn) -> list:
+        """
+        Returns one embedding (list of floats) per text, calling
+        `encode_fn(missing_texts)` only for cache misses.
+        """
+        if self.db is None:
+            self.misses += len(texts)
+            return [e.tolist() for e in encode_fn(texts)]
+
+        keys = [chunk_key(t, self.model_name) for t in texts]
+        found = {
+            row.key: np.frombuffer(row.vector, dtype="<f4").tolist()
+            for row in self.db.query(ChunkEmbedding).filter(ChunkEmbedding.key.in_(set(keys))).all()
+        }
+
+        # Encode each distinct missing chunk once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            embeddings = encode_fn(list(missing.values()))
+            rows = []
+            for key, embedding in zip(missing.keys(), embeddings):
+                vector = np.asarray(embedding, dtype="<f4")
+                found[key] = vector.tolist()
+                rows.append(ChunkEmbedding(
+                    key=key,
+                    model=self.model_name,
+                    dimension=vector.shape[0],
+                    vector=vector.tobytes()
+                ))
+            try:
+                self.db.add_all(rows)
+                self.db.commit()
+            except IntegrityError:
+                # Another ingestion stored the same chunk first; the cache is best-effort
+                self.db.rollback()
+
+        hits = len(texts) - len(missing)
+        self.hits += hits
+        self.misses += len(texts) - hits
+        return [found[key] for key in keys]
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return round(self.hits / total, 4) if total else 0.0
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
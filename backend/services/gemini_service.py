@@ -1,7 +1,9 @@
 import os
 from google import genai
+from google.genai import types
 import json
 from dotenv import load_dotenv
+from services.llm_provider import LLM_TIMEOUT, http_event_hooks
 
 # Load environment variables
 load_dotenv()
@@ -11,7 +13,14 @@ api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     raise ValueError("GEMINI_API_KEY not found in environment variables")
 
-client = genai.Client(api_key=api_key)
+# One client (and connection pool) per process; calls go through its async API (client.aio)
+client = genai.Client(
+    api_key=api_key,
+    http_options=types.HttpOptions(
+        timeout=int(LLM_TIMEOUT * 1000),
+        async_client_args={"event_hooks": http_event_hooks("gemini")}  # 429s pause the rate limiter
+    )
+)
 
 # Use Flash model for speed (good for real-time voice/quiz)
 MODEL_NAME = "gemini-2.5-flash" 
@@ -45,14 +54,12 @@ def refine_response(raw_response: str) -> dict:
             "quiz": {}
         }
 
-def ask_tutor(question: str):
+async def ask_tutor_answer(question: str):
     """
-    Generates a detailed answer + a 5-question quiz in JSON format.
+    Generates the detailed answer in JSON format, without the quiz (see generate_quiz).
     """
     system_instructions = """
-    You are a helpful and precise AI tutor.
-    1. Answer the question in detail.
-    2. Generate a 5-question quiz based on the answer.
+    You are a helpful and precise AI tutor. Answer the question in detail.
 
     CRITICAL: You must output ONLY valid JSON. Do not add any text before or after the JSON.
     
@@ -61,21 +68,12 @@ def ask_tutor(question: str):
         "question": "The user's question",
         "answer": "Your detailed answer goes here.",
         "topic": "The specific topic",
-        "field": "The general field of study",
-        "quiz": {
-            "1": {
-                "question": "Question text",
-                "options": {"1": "Option A", "2": "Option B", "3": "Option C", "4": "Option D"},
-                "answer": "2", 
-                "difficulty": "easy"
-            },
-            ... (repeat for questions 2, 3, 4, 5)
-        }
+        "field": "The general field of study"
     }
     """
 
     try:
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model=MODEL_NAME,
             contents=[
                 {"role": "user", "parts": [{"text": system_instructions}, {"text": question}]}
@@ -87,7 +85,7 @@ def ask_tutor(question: str):
         print(f"Gemini API Error: {str(e)}")
         raise
 
-def ask_quick_tutor(question: str):
+async def ask_quick_tutor(question: str):
     """
     Generates a short, plain-text answer for the voice feature.
     """
@@ -98,7 +96,7 @@ def ask_quick_tutor(question: str):
     """
 
     try:
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model=MODEL_NAME,
             contents=[
                 {"role": "user", "parts": [{"text": system_instructions}, {"text": question}]}
@@ -107,9 +105,10 @@ def ask_quick_tutor(question: str):
         return response.text
 
     except Exception as e:
-        return f"I'm having trouble connecting to the AI service right now. Error: {str(e)}"
+        print(f"Gemini API Error: {str(e)}")
+        raise
 
-def analyze_student_performance(history_text: str):
+async def analyze_student_performance(history_text: str):
     """
     Analyzes quiz history and returns a JSON report for the dashboard.
     """
@@ -128,7 +127,7 @@ def analyze_student_performance(history_text: str):
     """
 
     try:
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model=MODEL_NAME,
             contents=[
                 {"role": "user", "parts": [{"text": system_instruction}, {"text": f"Student History:\n{history_text}"}]}
@@ -138,14 +137,9 @@ def analyze_student_performance(history_text: str):
 
     except Exception as e:
         print(f"Analysis Error: {e}")
-        return {
-            "average_score": 0,
-            "strong_topics": [],
-            "weak_topics": [],
-            "advice": "Could not generate analysis at this time."
-        }
+        raise
     
-def ask_pdf_tutor(question: str, context: str):
+async def ask_pdf_tutor(question: str, context: str):
     system_instruction = """
     You are a helpful assistant. Answer the user's question ONLY based on the provided Context.
     If the answer is not in the context, say "I couldn't find that in the document."
@@ -155,7 +149,7 @@ def ask_pdf_tutor(question: str, context: str):
     prompt = f"Context:\n{context}\n\nQuestion:\n{question}"
 
     try:
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model="gemini-2.5-flash",
             contents=[
                 {"role": "user", "parts": [{"text": system_instruction}, {"text": prompt}]}
@@ -163,4 +157,97 @@ def ask_pdf_tutor(question: str, context: str):
         )
         return response.text
     except Exception as e:
-        return "Error generating PDF answer."
\ No newline at end of file
+        print(f"Gemini PDF Error: {str(e)}")
+        raise
+
+async def stream_tutor_answer(question: str):
+    """
+    Streams the detailed markdown answer chunk by chunk (no quiz; see generate_quiz).
+    """
+    system_instructions = """
+    You are a helpful and precise AI tutor.
+    Answer the question in detail. Use markdown. Do NOT use JSON.
+    """
+
+    stream = await client.aio.models.generate_content_stream(
+        model=MODEL_NAME,
+        contents=[
+            {"role": "user", "parts": [{"text": system_instructions}, {"text": question}]}
+        ]
+    )
+    async for chunk in stream:
+        if chunk.text:
+            yield chunk.text
+
+async def generate_quiz(question: str, answer: str):
+    """
+    Generates topic, field and a 5-question quiz for an answer that was already given.
+    """
+    system_instructions = """
+    You are a helpful and precise AI tutor.
+    Generate a 5-question quiz based on the question and answer below.
+
+    CRITICAL: You must output ONLY valid JSON. Do not add any text before or after the JSON.
+    
+    The JSON structure must be exactly this:
+    {
+        "topic": "The specific topic",
+        "field": "The general field of study",
+        "quiz": {
+            "1": {
+                "question": "Question text",
+                "options": {"1": "Option A", "2": "Option B", "3": "Option C", "4": "Option D"},
+                "answer": "2", 
+                "difficulty": "easy"
+            },
+            ... (repeat for questions 2, 3, 4, 5)
+        }
+    }
+    """
+
+    response = await client.aio.models.generate_content(
+        model=MODEL_NAME,
+        contents=[
+            {"role": "user", "parts": [{"text": system_instructions}, {"text": f"Question:\n{question}\n\nAnswer:\n{answer}"}]}
+        ]
+    )
+    return refine_response(response.text)
+
+async def stream_quick_tutor(question: str):
+    """
+    Streams the short plain-text voice answer.
+    """
+    system_instructions = """
+    You are a helpful AI tutor. The user is asking via voice.
+    Provide a clear, concise answer in plain text.
+    Keep it under 3-4 sentences. Do NOT use JSON.
+    """
+
+    stream = await client.aio.models.generate_content_stream(
+        model=MODEL_NAME,
+        contents=[
+            {"role": "user", "parts": [{"text": system_instructions}, {"text": question}]}
+        ]
+    )
+    async for chunk in stream:
+        if chunk.text:
+            yield chunk.text
+
+async def stream_pdf_tutor(question: str, context: str):
+    system_instruction = """
+    You are a helpful assistant. Answer the user's question ONLY based on the provided Context.
+    If the answer is not in the context, say "I couldn't find that in the document."
+    Keep answer concise.
+    """
+    
+    prompt = f"Context:\n{context}\n\nQuestion:\n{question}"
+
+    stream = await client.aio.models.generate_content_stream(
+        model="gemini-2.5-flash",
+        contents=[
+            {"role": "user", "parts": [{"text": system_instruction}, {"text": prompt}]}
+        ]
+    )
+    async for chunk in stream:
+        if chunk.text:
+            yield chunk.text
@@ -1,8 +1,8 @@
 import os
-import io
 import json
-from groq import Groq
+from groq import AsyncGroq
 from dotenv import load_dotenv
+from services.llm_provider import LLM_TIMEOUT, shared_http_client
 
 # Load environment variables
 load_dotenv()
@@ -12,7 +12,8 @@ api_key = os.getenv("GROQ_API_KEY")
 if not api_key:
     raise ValueError("GROQ_API_KEY not found in environment variables")
 
-client = Groq(api_key=api_key)
+# One async client (and connection pool) per process, shared by every request
+client = AsyncGroq(api_key=api_key, timeout=LLM_TIMEOUT, http_client=shared_http_client("groq"))
 
 GROQ_MODEL = "llama-3.3-70b-versatile" 
 
@@ -41,12 +42,12 @@ def refine_response(raw_response: str) -> dict:
             "quiz": {}
         }
 
-def ask_tutor(question: str):
+async def ask_tutor_answer(question: str):
     """
-    Generates a detailed answer + a 5-question quiz in JSON format.
+    Generates the detailed answer in JSON format, without the quiz (see generate_quiz).
     """
     system_instructions = """
-    You are an AI tutor. Answer the question in very detail - cover each possible point in the topic and generate a 5-question quiz.
+    You are an AI tutor. Answer the question in very detail - cover each possible point in the topic.
     
     CRITICAL: Output ONLY valid JSON.
     
@@ -55,39 +56,27 @@ def ask_tutor(question: str):
         "question": "The user's question",
         "answer": "Your detailed explanation (markdown supported)",
         "topic": "The specific topic",
-        "field": "The general field of study",
-        "quiz": {
-            "1": {
-                "question": "Quiz Question 1",
-                "options": {"1": "A", "2": "B", "3": "C", "4": "D"},
-                "answer": "2", 
-                "difficulty": "easy"
-            },
-            ... (repeat for 5 questions)
-        }
+        "field": "The general field of study"
     }
     """
 
     try:
-        completion = client.chat.completions.create(
+        completion = await client.chat.completions.create(
             model=GROQ_MODEL,
             messages=[
                 {'role': 'system', 'content': system_instructions},
                 {'role': 'user', 'content': question},
             ],
-            # Groq JSON mode ensures valid structure
             response_format={"type": "json_object"},
-            temperature=0.3 # Lower temperature for more consistent JSON
+            temperature=0.3
         )
-        
-        raw_text = completion.choices[0].message.content
-        return refine_response(raw_text)
+        return refine_response(completion.choices[0].message.content)
 
     except Exception as e:
         print(f"Groq Error: {str(e)}")
         raise
 
-def ask_quick_tutor(question: str):
+async def ask_quick_tutor(question: str):
     """
     Generates a short, plain-text answer for the voice feature.
     """
@@ -97,7 +86,7 @@ def ask_quick_tutor(question: str):
     """
 
     try:
-        completion = client.chat.completions.create(
+        completion = await client.chat.completions.create(
             model=GROQ_MODEL,
             messages=[
                 {'role': 'system', 'content': system_instructions},
@@ -109,9 +98,10 @@ def ask_quick_tutor(question: str):
         return completion.choices[0].message.content
 
     except Exception as e:
-        return f"Error communicating with Groq: {str(e)}"
+        print(f"Groq Error: {str(e)}")
+        raise
 
-def analyze_student_performance(history_text: str):
+async def analyze_student_performance(history_text: str):
     """
     Analyzes quiz history and returns a JSON report.
     """
@@ -130,7 +120,7 @@ def analyze_student_performance(history_text: str):
     """
 
     try:
-        completion = client.chat.completions.create(
+        completion = await client.chat.completions.create(
             model=GROQ_MODEL,
             messages=[
                 {'role': 'system', 'content': system_instruction},
@@ -142,14 +132,9 @@ def analyze_student_performance(history_text: str):
         return refine_response(completion.choices[0].message.content)
     except Exception as e:
         print(f"Analysis Error: {e}")
-        return {
-            "average_score": 0,
-            "strong_topics": [],
-            "weak_topics": [],
-            "advice": "Could not generate analysis at this time."
-        }
+        raise
 
-def ask_pdf_tutor(question: str, context: str):
+async def ask_pdf_tutor(question: str, context: str):
     """
     RAG Answer generation based on PDF context.
     """
@@ -163,7 +148,7 @@ def ask_pdf_tutor(question: str, context: str):
     prompt = f"Context:\n{context}\n\nQuestion:\n{question}"
 
     try:
-        completion = client.chat.completions.create(
+        completion = await client.chat.completions.create(
             model=GROQ_MODEL,
             messages=[
                 {"role": "system", "content": system_instruction},
@@ -173,27 +158,116 @@ def ask_pdf_tutor(question: str, context: str):
         )
         return completion.choices[0].message.content
     except Exception as e:
-        return f"Error generating PDF answer: {str(e)}"
+        print(f"Groq PDF Error: {str(e)}")
+        raise
     
 
+async def stream_tutor_answer(question: str):
+    """
+    Streams the detailed markdown answer token by token (no quiz; see generate_quiz).
+    """
+    system_instructions = """
+    You are an AI tutor. Answer the question in very detail - cover each possible point in the topic.
+    Use markdown. Do NOT use JSON.
+    """
 
+    stream = await client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=[
+            {'role': 'system', 'content': system_instructions},
+            {'role': 'user', 'content': question},
+        ],
+        temperature=0.3,
+        stream=True
+    )
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            yield delta
 
-def transcribe_audio(audio_bytes: bytes):
+async def generate_quiz(question: str, answer: str):
     """
-    Transcribes audio bytes using Groq's Whisper model.
+    Generates topic, field and a 5-question quiz for an answer that was already given.
     """
-    try:
-        audio_file = io.BytesIO(audio_bytes)
-        audio_file.name = "audio.webm" 
-
-        transcription = client.audio.transcriptions.create(
-            file=(audio_file.name, audio_file.read()),
-            model="distil-whisper-large-v3-en", # Groq's fast whisper model
-            response_format="text",
-            language="en"
-        )
-        
-        return transcription
-    except Exception as e:
-        print(f"Groq Transcription Error: {e}")
-        return None
\ No newline at end of file
+    system_instructions = """
+    You are an AI tutor. The student asked the question below and read the answer below.
+    Generate a 5-question quiz that checks their understanding of that answer.
+
+    CRITICAL: Output ONLY valid JSON.
+
+    JSON Structure:
+    {
+        "topic": "The specific topic",
+        "field": "The general field of study",
+        "quiz": {
+            "1": {
+                "question": "Quiz Question 1",
+                "options": {"1": "A", "2": "B", "3": "C", "4": "D"},
+                "answer": "2", 
+                "difficulty": "easy"
+            },
+            ... (repeat for 5 questions)
+        }
+    }
+    """
+
+    completion = await client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=[
+            {'role': 'system', 'content': system_instructions},
+            {'role': 'user', 'content': f"Question:\n{question}\n\nAnswer:\n{answer}"},
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.3
+    )
+    return refine_response(completion.choices[0].message.content)
+
+async def stream_quick_tutor(question: str):
+    """
+    Streams the short plain-text voice answer.
+    """
+    system_instructions = """
+    You are a helpful AI tutor. Provide a clear, concise answer in plain text.
+    Keep it under 3-4 sentences. Do NOT use JSON.
+    """
+
+    stream = await client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=[
+            {'role': 'system', 'content': system_instructions},
+            {'role': 'user', 'content': question},
+        ],
+        temperature=0.5,
+        stream=True
+    )
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            yield delta
+
+async def stream_pdf_tutor(question: str, context: str):
+    """
+    Streams the RAG answer based on PDF context.
+    """
+    system_instruction = """
+    You are a helpful AI tutor. Answer the user's question ONLY based on the provided Context. 
+    Study the context carefully and answer only if the information is present in the context, 
+    otherwise say "I couldn't find that in the document." and suggest related topics based on context.
+    Keep answer concise.
+    """
+    
+    prompt = f"Context:\n{context}\n\nQuestion:\n{question}"
+
+    stream = await client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=[
+            {"role": "system", "content": system_instruction},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.5,
+        stream=True
+    )
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            yield delta
@@ -0,0 +1,142 @@
+import os
+import json
+import traceback
+from database import SessionLocal
+from models.pdf_model import (
+    UserPDF,
+    PDF_STATUS_EXTRACTING,
+    PDF_STATUS_EMBEDDING,
+    PDF_STATUS_INDEXED,
+    PDF_STATUS_FAILED,
+)
+from services.rag_service import process_pdf, count_pages, vector_store
+from services.answer_cache import answer_cache
+from services.chunk_store import delete_namespace
+from services import bm25_index
+from services.upload_store import object_hash
+
+
+def _update_status(db, namespace: str, **fields):
+    """
+    Updates every UserPDF row that shares this namespace (deduplicated uploads
+    point at the same vectors, so they share the same ingestion job).
+    """
+    db.query(UserPDF).filter(UserPDF.pinecone_namespace == namespace).update(fields, synchronize_session=False)
+    db.commit()
+
+
+def _remove_unreferenced_upload(db, file_path: str, namespace: str, content_hash: str):
+    """
+    Deletes a failed upload's stored object unless a row outside this ingestion
+    job (another namespace) still points at the same content-addressed bytes.
+    """
+    if not content_hash or not os.path.exists(file_path):
+        return
+    in_use = db.query(UserPDF.id).filter(
+        UserPDF.content_hash == content_hash,
+        UserPDF.pinecone_namespace != namespace
+    ).first()
+    if not in_use:
+        os.remove(file_path)
+
+
+def _namespace_owned(db, namespace: str) -> bool:
+    return db.query(UserPDF.id).filter(UserPDF.pinecone_namespace == namespace).first() is not None
+
+
+def _abandon(db, file_path: str, namespace: str, content_hash: str):
+    """
+    Cleans up after a job whose rows moved to another namespace while it ran
+    (the upload was replaced): nothing will ever read what it wrote.
+    """
+    print(f"Ingestion: '{namespace}' was replaced while processing, discarding it")
+    try:
+        discard_namespace(namespace)
+    except Exception as e:
+        print(f"Namespace Cleanup Error ({namespace}): {str(e)}")
+    _remove_unreferenced_upload(db, file_path, namespace, content_hash)
+
+
+def run_ingestion(pdf_id: str, file_path: str, namespace: str, previous_pages: list = None):
+    """
+    Background job: extracts, embeds and indexes an uploaded PDF,
+    persisting status and progress on the UserPDF rows as it goes.
+    With `previous_pages` only pages that changed since the last ingest are re-embedded.
+    If no row points at `namespace` any more (a replace arrived while the job
+    was queued or running), the job discards what it wrote instead.
+    Runs in a worker thread, so it opens its own DB session.
+    """
+    db = SessionLocal()
+    content_hash = object_hash(file_path)
+    try:
+        try:
+            if not _namespace_owned(db, namespace):
+                _abandon(db, file_path, namespace, content_hash)
+                return
+
+            # The upload scan usually knows the page count already; open the file only if it did not
+            pdf = db.query(UserPDF).filter(UserPDF.id == pdf_id).first()
+            pages_total = pdf.pages_total if pdf and pdf.pages_total else count_pages(file_path)
+            _update_status(db, namespace, status=PDF_STATUS_EXTRACTING, pages_total=pages_total)
+
+            def on_progress(pages: int, chunks: int):
+                _update_status(db, namespace, status=PDF_STATUS_EMBEDDING, pages_processed=pages, chunks_processed=chunks)
+
+            stats = process_pdf(file_path, namespace, on_progress=on_progress, previous_pages=previous_pages)
+
+            if not _namespace_owned(db, namespace):
+                _abandon(db, file_path, namespace, content_hash)
+                return
+
+            _update_status(
+                db, namespace,
+                status=PDF_STATUS_INDEXED,
+                pages_total=stats["pages"],
+                pages_processed=stats["pages"],
+                chunks_processed=stats["chunks"],
+                page_hashes=json.dumps(stats["page_hashes"]),
+                token_count=stats["tokens"],
+                error=None
+            )
+            # Answers cached against the previous index are stale now
+            answer_cache.invalidate(namespace)
+
+        except Exception as e:
+            print(f"Ingestion Error ({pdf_id}): {str(e)}")
+            traceback.print_exc()
+            db.rollback()
+            if not _namespace_owned(db, namespace):
+                _abandon(db, file_path, namespace, content_hash)
+                return
+            _update_status(db, namespace, status=PDF_STATUS_FAILED, error=str(e))
+            _remove_unreferenced_upload(db, file_path, namespace, content_hash) # Cleanup on failure
+    finally:
+        db.close()
+
+
+def discard_namespace(namespace: str):
+    """
+    Removes a namespace's vectors (and their files with the local store),
+    chunk text, BM25 index and stored document text.
+    """
+    vector_store.delete_namespace(namespace)
+    delete_namespace(namespace)
+    bm25_index.delete_index(namespace)
+    answer_cache.invalidate(namespace)
+
+
+def release_namespace(namespace: str):
+    """
+    Background job: discards a namespace once no UserPDF row points at it
+    (after a replace moved its rows to another namespace).
+    """
+    db = SessionLocal()
+    try:
+        if db.query(UserPDF.id).filter(UserPDF.pinecone_namespace == namespace).first():
+            return
+    finally:
+        db.close()
+    try:
+        discard_namespace(namespace)
+    except Exception as e:
+        print(f"Namespace Cleanup Error ({namespace}): {str(e)}")
@@ -0,0 +1,541 @@
+import os
+import time
+import asyncio
+import hashlib
+import importlib
+import threading
+from collections import deque
+import httpx
+from dotenv import load_dotenv
+from core.metrics import LatencyTracker
+from core.singleflight import SingleFlight
+from services.rate_limiter import get_rate_limiter, RateLimitExceeded
+from services.token_utils import count_tokens
+
+load_dotenv()
+
+# Configuration
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq").lower()  # groq, gemini or ollama
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # seconds, network timeout inside the SDK clients
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "256"))  # per provider, shared by all requests
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "64"))
+
+# Whole-call deadline per operation (seconds)
+CALL_TIMEOUTS = {
+    "ask_tutor_answer": float(os.getenv("LLM_TUTOR_TIMEOUT", "90")),
+    "ask_quick_tutor": float(os.getenv("LLM_QUICK_TIMEOUT", "20")),
+    "ask_pdf_tutor": float(os.getenv("LLM_PDF_TIMEOUT", "45")),
+    "analyze_student_performance": float(os.getenv("LLM_ANALYSIS_TIMEOUT", "60")),
+    "generate_quiz": float(os.getenv("LLM_QUIZ_TIMEOUT", "60")),
+}
+# Streams share the deadline of their one-shot counterpart
+CALL_TIMEOUTS["stream_tutor_answer"] = CALL_TIMEOUTS["ask_tutor_answer"]
+CALL_TIMEOUTS["stream_quick_tutor"] = CALL_TIMEOUTS["ask_quick_tutor"]
+CALL_TIMEOUTS["stream_pdf_tutor"] = CALL_TIMEOUTS["ask_pdf_tutor"]
+
+# Expected completion tokens per operation, added to the prompt for rate-limit budgeting
+COMPLETION_TOKENS = {
+    "ask_tutor_answer": 1500,
+    "stream_tutor_answer": 1500,
+    "generate_quiz": 1000,
+    "ask_quick_tutor": 200,
+    "stream_quick_tutor": 200,
+    "ask_pdf_tutor": 500,
+    "stream_pdf_tutor": 500,
+    "analyze_student_performance": 400,
+}
+
+PROVIDER_MODULES = {
+    "groq": "services.groq_service",
+    "gemini": "services.gemini_service",
+    "ollama": "services.ollama_service",
+}
+
+# Routing: providers in preference order; LLM_PROVIDER goes first unless LLM_PROVIDERS is set
+LLM_PROVIDERS = [
+    name for name in dict.fromkeys(
+        n.strip().lower() for n in os.getenv("LLM_PROVIDERS", f"{LLM_PROVIDER},groq,gemini,ollama").split(",")
+    ) if name
+]
+LLM_HEALTH_WINDOW = int(os.getenv("LLM_HEALTH_WINDOW", "50"))  # recent calls per provider used for the error rate
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))  # error rate that opens the circuit
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))  # calls in the window before it can open
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconds open before a trial call
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "0") == "1"  # costs a second generation when it fires
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # latencies needed before p95 is trusted
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))  # seconds, floor for the hedge delay
+
+LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "1") == "1"  # share one upstream call among identical concurrent ones
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+# Time to first token of streamed answers, per provider and operation
+ttft_latency = LatencyTracker()
+
+# Successful call latency (time to first token for streams), per provider and operation
+provider_latency = LatencyTracker()
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeoutError(LLMError):
+    pass
+
+
+class ProviderUnavailable(LLMError):
+    pass
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE)
+
+
+def http_event_hooks(provider: str) -> dict:
+    """
+    httpx hooks feeding every provider response's rate-limit headers to its limiter.
+    """
+    limiter = get_rate_limiter(provider)
+
+    async def observe(response: httpx.Response):
+        limiter.observe(response.status_code, response.headers)
+
+    return {"response": [observe]}
+
+
+def shared_http_client(provider: str) -> httpx.AsyncClient:
+    """
+    Pooled async HTTP client for one provider SDK, kept for the life of the process.
+    """
+    return httpx.AsyncClient(limits=http_limits(), timeout=LLM_TIMEOUT, event_hooks=http_event_hooks(provider))
+
+
+def estimate_tokens(operation: str, args) -> int:
+    return sum(count_tokens(arg) for arg in args) + COMPLETION_TOKENS.get(operation, 0)
+
+
+class LLMProvider:
+    """
+    Async interface to one LLM backend. The backend is a services/*_service.py
+    module exposing the same coroutines and async generators; it is imported on first use, so
+    only configured providers need their SDK and API key.
+    Every call runs under its CALL_TIMEOUTS deadline and raises LLMTimeoutError past it.
+    """
+
+    def __init__(self, name: str):
+        if name not in PROVIDER_MODULES:
+            raise ValueError(f"Unknown LLM_PROVIDER '{name}' (expected one of {', '.join(PROVIDER_MODULES)})")
+        self.name = name
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            try:
+                self._module = importlib.import_module(PROVIDER_MODULES[self.name])
+            except Exception as e:
+                raise ProviderUnavailable(f"LLM provider '{self.name}' is not available: {e}") from e
+        return self._module
+
+    async def _call(self, operation: str, *args):
+        timeout = CALL_TIMEOUTS[operation]
+        try:
+            return await asyncio.wait_for(getattr(self.module, operation)(*args), timeout)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"{self.name} did not answer {operation} within {timeout:g}s")
+
+    async def _stream(self, operation: str, *args):
+        """
+        Yields text chunks as the model produces them, under the same deadline
+        as the whole call; records time to first token in ttft_latency.
+        """
+        timeout = CALL_TIMEOUTS[operation]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        started = time.perf_counter()
+        first = True
+        chunks = getattr(self.module, operation)(*args)
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), max(deadline - loop.time(), 0))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError(f"{self.name} did not finish {operation} within {timeout:g}s")
+                if first:
+                    ttft_latency.record(f"{self.name}.{operation}", (time.perf_counter() - started) * 1000)
+                    first = False
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def ask_tutor_answer(self, question: str) -> dict:
+        return await self._call("ask_tutor_answer", question)
+
+    async def ask_quick_tutor(self, question: str) -> str:
+        return await self._call("ask_quick_tutor", question)
+
+    async def ask_pdf_tutor(self, question: str, context: str) -> str:
+        return await self._call("ask_pdf_tutor", question, context)
+
+    async def analyze_student_performance(self, history_text: str) -> dict:
+        return await self._call("analyze_student_performance", history_text)
+
+    async def generate_quiz(self, question: str, answer: str) -> dict:
+        return await self._call("generate_quiz", question, answer)
+
+    def stream_tutor_answer(self, question: str):
+        return self._stream("stream_tutor_answer", question)
+
+    def stream_quick_tutor(self, question: str):
+        return self._stream("stream_quick_tutor", question)
+
+    def stream_pdf_tutor(self, question: str, context: str):
+        return self._stream("stream_pdf_tutor", question, context)
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Case- and whitespace-insensitive form of a prompt, for coalescing.
+    """
+    return " ".join(text.split()).casefold()
+
+
+class ProviderHealth:
+    """
+    Rolling error rate and circuit breaker for one provider. The circuit opens
+    when the error rate over the last `window` calls reaches LLM_BREAKER_ERROR_RATE;
+    after LLM_BREAKER_COOLDOWN seconds one trial call is let through (half open),
+    and its outcome closes or re-opens the circuit. A provider whose SDK or
+    API key is missing is disabled for the life of the process.
+    """
+
+    def __init__(self, name: str, window: int = LLM_HEALTH_WINDOW):
+        self.name = name
+        self.outcomes = deque(maxlen=window)
+        self.state = BREAKER_CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.disabled = None
+        self.calls = 0
+        self.errors = 0
+        self.opens = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.disabled:
+                return False
+            if self.state == BREAKER_OPEN and time.monotonic() - self.opened_at >= LLM_BREAKER_COOLDOWN:
+                self.state = BREAKER_HALF_OPEN
+                self.trial_in_flight = False
+            if self.state == BREAKER_HALF_OPEN:
+                if self.trial_in_flight:
+                    return False
+                self.trial_in_flight = True
+            return self.state != BREAKER_OPEN
+
+    def record(self, ok: bool):
+        with self._lock:
+            self.calls += 1
+            self.errors += 0 if ok else 1
+            self.outcomes.append(ok)
+            if self.state == BREAKER_HALF_OPEN:
+                self.trial_in_flight = False
+                if ok:
+                    self.state = BREAKER_CLOSED
+                    self.outcomes.clear()
+                else:
+                    self._open()
+            elif self.state == BREAKER_CLOSED and not ok and len(self.outcomes) >= LLM_BREAKER_MIN_CALLS \
+                    and self.error_rate >= LLM_BREAKER_ERROR_RATE:
+                self._open()
+
+    def release(self):
+        """
+        An admitted call was cancelled (e.g. it lost a hedge) without an outcome.
+        """
+        with self._lock:
+            if self.state == BREAKER_HALF_OPEN:
+                self.trial_in_flight = False
+
+    def disable(self, reason: str):
+        with self._lock:
+            self.disabled = reason
+
+    def _open(self):
+        self.state = BREAKER_OPEN
+        self.opened_at = time.monotonic()
+        self.opens += 1
+
+    @property
+    def error_rate(self) -> float:
+        return (len(self.outcomes) - sum(self.outcomes)) / len(self.outcomes) if self.outcomes else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "state": "disabled" if self.disabled else self.state,
+            "disabled_reason": self.disabled,
+            "error_rate": round(self.error_rate, 4),
+            "calls": self.calls,
+            "errors": self.errors,
+            "circuit_opens": self.opens,
+        }
+
+
+class LLMRouter:
+    """
+    Sends each call to the most preferred provider whose circuit is closed and
+    fails over to the next one on errors or timeouts, within the operation's
+    CALL_TIMEOUTS deadline. With LLM_HEDGE_ENABLED, if the first provider has
+    not answered after its p95 latency for the operation, the same call is
+    also sent to the next provider and the first answer wins; the other call
+    is cancelled. Streams fail over and hedge until their first token.
+    With LLM_SINGLE_FLIGHT, identical concurrent calls (same operation,
+    normalised prompt and provider) share one upstream call or stream.
+    Same interface as LLMProvider.
+    """
+
+    def __init__(self, names: list = LLM_PROVIDERS):
+        self.providers = [LLMProvider(name) for name in names]
+        self.health = {provider.name: ProviderHealth(provider.name) for provider in self.providers}
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.single_flight = SingleFlight()
+
+    @property
+    def name(self) -> str:
+        """
+        The provider new calls currently go to first.
+        """
+        for provider in self.providers:
+            health = self.health[provider.name]
+            if not health.disabled and health.state != BREAKER_OPEN:
+                return provider.name
+        return self.providers[0].name
+
+    def _hedge_delay(self, provider: LLMProvider, operation: str):
+        label = f"{provider.name}.{operation}"
+        if not LLM_HEDGE_ENABLED or provider_latency.counts.get(label, 0) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(provider_latency.percentile(label, 0.95) / 1000, LLM_HEDGE_MIN_DELAY)
+
+    async def _attempt(self, provider: LLMProvider, operation: str, start, tokens: int, deadline: float):
+        health = self.health[provider.name]
+        # Queue for the provider's quota; shed at once if the wait would leave
+        # less than the provider's median latency before the deadline
+        median_ms = provider_latency.percentile(f"{provider.name}.{operation}", 0.5) or 0
+        try:
+            await get_rate_limiter(provider.name).acquire(tokens, deadline - median_ms / 1000)
+        except BaseException:
+            health.release()
+            raise
+        started = time.perf_counter()
+        try:
+            result = await start(provider)
+        except ProviderUnavailable as e:
+            health.disable(str(e))
+            raise
+        except asyncio.CancelledError:
+            health.release()
+            raise
+        except Exception:
+            health.record(False)
+            raise
+        health.record(True)
+        provider_latency.record(f"{provider.name}.{operation}", (time.perf_counter() - started) * 1000)
+        return result
+
+    async def _race(self, operation: str, start, tokens: int, discard=None):
+        """
+        Runs `start(provider)` with failover and optional hedging; returns
+        (provider, result) of the first success. `tokens` is the estimate
+        charged to each provider's rate limiter. `discard(result)` cleans up
+        results that lose the race.
+        """
+        loop = asyncio.get_running_loop()
+        timeout = CALL_TIMEOUTS[operation]
+        deadline = loop.time() + timeout
+        shed = []
+        candidates = list(self.providers)
+        pending = {}
+        errors = []
+        hedged = False
+
+        def launch() -> bool:
+            # Admission is checked only when a provider is actually used (half-open trials)
+            while candidates:
+                provider = candidates.pop(0)
+                if self.health[provider.name].allow():
+                    # loop.time() is time.monotonic(), the limiter's clock
+                    attempt = self._attempt(provider, operation, start, tokens, deadline)
+                    pending[asyncio.ensure_future(attempt)] = provider
+                    return True
+            return False
+
+        if not launch():
+            raise ProviderUnavailable("No LLM provider is available right now (all circuits open)")
+        first = next(iter(pending.values()))
+        started_at = time.perf_counter()
+
+        try:
+            while pending:
+                wait = deadline - loop.time()
+                hedge_delay = self._hedge_delay(first, operation) if candidates and not hedged else None
+                if hedge_delay is not None:
+                    wait = min(wait, hedge_delay - (time.perf_counter() - started_at))
+
+                done, _ = await asyncio.wait(pending, timeout=max(wait, 0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if loop.time() >= deadline:
+                        raise LLMTimeoutError(f"No LLM provider answered {operation} within {timeout:g}s")
+                    hedged = True
+                    if launch():
+                        self.hedges += 1
+                    continue
+
+                winner = None
+                for task in done:
+                    provider = pending.pop(task)
+                    if isinstance(task.exception(), RateLimitExceeded):
+                        shed.append(task.exception())
+                        errors.append(f"{provider.name}: {task.exception()}")
+                    elif task.exception() is not None:
+                        errors.append(f"{provider.name}: {task.exception()}")
+                    elif winner is None:
+                        winner = (provider, task.result())
+                    elif discard:
+                        await discard(task.result())
+                if winner:
+                    if hedged and winner[0] is not first:
+                        self.hedge_wins += 1
+                    return winner
+
+                # Fail over to the next provider once nothing is left in flight
+                if not pending and launch():
+                    self.failovers += 1
+        finally:
+            for task in pending:
+                task.cancel()
+            for task in pending:
+                try:
+                    result = await task
+                except BaseException:
+                    continue
+                if discard:
+                    await discard(result)
+
+        if shed and len(shed) == len(errors):
+            # Every provider is over quota: tell the client when to come back
+            raise RateLimitExceeded("; ".join(errors), retry_after=min(e.retry_after for e in shed))
+        raise ProviderUnavailable(f"All LLM providers failed {operation}: " + "; ".join(errors))
+
+    def _flight_key(self, operation: str, args) -> tuple:
+        prompt = "\x1f".join(normalize_prompt(arg) for arg in args)
+        return operation, hashlib.sha256(prompt.encode("utf-8")).hexdigest(), self.name
+
+    async def _routed_call(self, operation: str, *args):
+        _, result = await self._race(
+            operation, lambda provider: provider._call(operation, *args), estimate_tokens(operation, args)
+        )
+        return result
+
+    async def _call(self, operation: str, *args):
+        if not LLM_SINGLE_FLIGHT:
+            return await self._routed_call(operation, *args)
+        return await self.single_flight.do(
+            self._flight_key(operation, args), lambda: self._routed_call(operation, *args)
+        )
+
+    @staticmethod
+    async def _open_stream(provider: LLMProvider, operation: str, args):
+        """
+        Starts a provider stream and waits for its first chunk (None if it is empty).
+        """
+        chunks = provider._stream(operation, *args)
+        try:
+            return chunks, await chunks.__anext__()
+        except StopAsyncIteration:
+            return chunks, None
+        except BaseException:
+            await chunks.aclose()
+            raise
+
+    def _stream(self, operation: str, *args):
+        if not LLM_SINGLE_FLIGHT:
+            return self._routed_stream(operation, *args)
+        return self.single_flight.stream(
+            self._flight_key(operation, args), lambda: self._routed_stream(operation, *args)
+        )
+
+    async def _routed_stream(self, operation: str, *args):
+        async def discard(result):
+            await result[0].aclose()
+
+        provider, (chunks, first) = await self._race(
+            operation, lambda p: self._open_stream(p, operation, args), estimate_tokens(operation, args), discard
+        )
+        try:
+            if first is None:
+                return
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except Exception:
+            # Failed mid-stream, after the race was won
+            self.health[provider.name].record(False)
+            raise
+        finally:
+            await chunks.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "order": [provider.name for provider in self.providers],
+            "hedging": LLM_HEDGE_ENABLED,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "providers": {name: health.stats() for name, health in self.health.items()},
+            "latency": provider_latency.stats(),
+            "rate_limits": {provider.name: get_rate_limiter(provider.name).stats() for provider in self.providers},
+        }
+
+    async def ask_tutor_answer(self, question: str) -> dict:
+        return await self._call("ask_tutor_answer", question)
+
+    async def ask_quick_tutor(self, question: str) -> str:
+        return await self._call("ask_quick_tutor", question)
+
+    async def ask_pdf_tutor(self, question: str, context: str) -> str:
+        return await self._call("ask_pdf_tutor", question, context)
+
+    async def analyze_student_performance(self, history_text: str) -> dict:
+        return await self._call("analyze_student_performance", history_text)
+
+    async def generate_quiz(self, question: str, answer: str) -> dict:
+        return await self._call("generate_quiz", question, answer)
+
+    def stream_tutor_answer(self, question: str):
+        return self._stream("stream_tutor_answer", question)
+
+    def stream_quick_tutor(self, question: str):
+        return self._stream("stream_quick_tutor", question)
+
+    def stream_pdf_tutor(self, question: str, context: str):
+        return self._stream("stream_pdf_tutor", question, context)
+
+
+llm_router = LLMRouter()
+
+
+def get_provider() -> LLMRouter:
+    """
+    The shared router over all configured providers.
+    """
+    return llm_router
@@ -1,9 +1,16 @@
-import ollama
+import os
 import json
+from ollama import AsyncClient
+from services.llm_provider import LLM_TIMEOUT, http_limits, http_event_hooks
 
 # Configuration
 OLLAMA_MODEL = "gemma3:4b"  # Or "mistral", "gemma", etc.
 
+# One async client (and connection pool) per process; host defaults to OLLAMA_HOST or localhost
+client = AsyncClient(
+    host=os.getenv("OLLAMA_HOST"), timeout=LLM_TIMEOUT, limits=http_limits(), event_hooks=http_event_hooks("ollama")
+)
+
 def refine_response(raw_response: str) -> dict:
     """
     Cleans up the LLM response to ensure it is valid JSON.
@@ -25,13 +32,12 @@ def refine_response(raw_response: str) -> dict:
         
         raise ValueError("Model response is not valid JSON")
 
-def ask_tutor(question: str):
+async def ask_tutor_answer(question: str):
     """
-    Generates a detailed answer + a 5-question quiz in JSON format.
+    Generates the detailed answer in JSON format, without the quiz (see generate_quiz).
     """
     system_instructions = """
-    You are an AI tutor. Answer the question in very detail - cover each possible point in the topic and generate a 5-question quiz.
-    
+    You are an AI tutor. Answer the question in very detail - cover each possible point in the topic.
     
     CRITICAL: Output ONLY valid JSON. Do not add introductions or conclusions.
     
@@ -40,33 +46,22 @@ def ask_tutor(question: str):
         "question": "The user's question",
         "answer": "Your detailed explanation",
         "topic": "The specific topic",
-        "field": "The general field of study",
-        "quiz": {
-            "1": {
-                "question": "Quiz Question 1",
-                "options": {"1": "A", "2": "B", "3": "C", "4": "D"},
-                "answer": "2", 
-                "difficulty": "easy"
-            },
-            ... (repeat for 5 questions)
-        }
+        "field": "The general field of study"
     }
     """
 
     try:
-        response = ollama.chat(model=OLLAMA_MODEL, messages=[
+        response = await client.chat(model=OLLAMA_MODEL, messages=[
             {'role': 'system', 'content': system_instructions},
             {'role': 'user', 'content': question},
         ])
-        
-        raw_text = response['message']['content']
-        return refine_response(raw_text)
+        return refine_response(response['message']['content'])
 
     except Exception as e:
         print(f"Ollama Error: {str(e)}")
         raise
 
-def ask_quick_tutor(question: str):
+async def ask_quick_tutor(question: str):
     """
     Generates a short, plain-text answer for the voice feature.
     """
@@ -76,7 +71,7 @@ def ask_quick_tutor(question: str):
     """
 
     try:
-        response = ollama.chat(model=OLLAMA_MODEL, messages=[
+        response = await client.chat(model=OLLAMA_MODEL, messages=[
             {'role': 'system', 'content': system_instructions},
             {'role': 'user', 'content': question},
         ])
@@ -84,10 +79,11 @@ def ask_quick_tutor(question: str):
         return response['message']['content']
 
     except Exception as e:
-        return f"Error communicating with Ollama: {str(e)}"
+        print(f"Ollama Error: {str(e)}")
+        raise
     
 
-def analyze_student_performance(history_text: str):
+async def analyze_student_performance(history_text: str):
     """
     Analyzes quiz history and returns a JSON report.
     """
@@ -106,21 +102,16 @@ def analyze_student_performance(history_text: str):
     """
 
     try:
-        response = ollama.chat(model=OLLAMA_MODEL, messages=[
+        response = await client.chat(model=OLLAMA_MODEL, messages=[
             {'role': 'system', 'content': system_instruction},
             {'role': 'user', 'content': f"Here is the student's recent performance:\n{history_text}"},
         ])
         return refine_response(response['message']['content'])
     except Exception as e:
         print(f"Analysis Error: {e}")
-        return {
-            "average_score": 0,
-            "strong_topics": [],
-            "weak_topics": [],
-            "advice": "Could not generate analysis at this time."
-        }
+        raise
     
-def ask_pdf_tutor(question: str, context: str):
+async def ask_pdf_tutor(question: str, context: str):
     system_instruction = """
     You are a helpful AI tutor. Answer the user's question ONLY based on the provided Context .Study the context carefully and answer only if the information is present in the context, otherwise say "I couldn't find that in the document." and ask the user did they want to ask something else in which you list related topics based on context. Keep answer concise. 
     Keep answer concise.
@@ -129,7 +120,7 @@ def ask_pdf_tutor(question: str, context: str):
     prompt = f"Context:\n{context}\n\nQuestion:\n{question}"
 
     try:
-        response = ollama.chat(
+        response = await client.chat(
             model=OLLAMA_MODEL,
             messages=[
                 {"role": "system", "content": system_instruction},
@@ -138,4 +129,91 @@ def ask_pdf_tutor(question: str, context: str):
         )
         return response['message']['content']
     except Exception as e:
-        return "Error generating PDF answer."
\ No newline at end of file
+        print(f"Ollama PDF Error: {str(e)}")
+        raise
+
+async def stream_tutor_answer(question: str):
+    """
+    Streams the detailed markdown answer token by token (no quiz; see generate_quiz).
+    """
+    system_instructions = """
+    You are an AI tutor. Answer the question in very detail - cover each possible point in the topic.
+    Use markdown. Do NOT use JSON.
+    """
+
+    stream = await client.chat(model=OLLAMA_MODEL, messages=[
+        {'role': 'system', 'content': system_instructions},
+        {'role': 'user', 'content': question},
+    ], stream=True)
+    async for part in stream:
+        if part['message']['content']:
+            yield part['message']['content']
+
+async def generate_quiz(question: str, answer: str):
+    """
+    Generates topic, field and a 5-question quiz for an answer that was already given.
+    """
+    system_instructions = """
+    You are an AI tutor. The student asked the question below and read the answer below.
+    Generate a 5-question quiz that checks their understanding of that answer.
+
+    CRITICAL: Output ONLY valid JSON. Do not add introductions or conclusions.
+
+    JSON Structure:
+    {
+        "topic": "The specific topic",
+        "field": "The general field of study",
+        "quiz": {
+            "1": {
+                "question": "Quiz Question 1",
+                "options": {"1": "A", "2": "B", "3": "C", "4": "D"},
+                "answer": "2", 
+                "difficulty": "easy"
+            },
+            ... (repeat for 5 questions)
+        }
+    }
+    """
+
+    response = await client.chat(model=OLLAMA_MODEL, messages=[
+        {'role': 'system', 'content': system_instructions},
+        {'role': 'user', 'content': f"Question:\n{question}\n\nAnswer:\n{answer}"},
+    ])
+    return refine_response(response['message']['content'])
+
+async def stream_quick_tutor(question: str):
+    """
+    Streams the short plain-text voice answer.
+    """
+    system_instructions = """
+    You are a helpful AI tutor. Provide a clear, concise answer in plain text.
+    Keep it under 3-4 sentences. Do NOT use JSON.
+    """
+
+    stream = await client.chat(model=OLLAMA_MODEL, messages=[
+        {'role': 'system', 'content': system_instructions},
+        {'role': 'user', 'content': question},
+    ], stream=True)
+    async for part in stream:
+        if part['message']['content']:
+            yield part['message']['content']
+
+async def stream_pdf_tutor(question: str, context: str):
+    system_instruction = """
+    You are a helpful AI tutor. Answer the user's question ONLY based on the provided Context .Study the context carefully and answer only if the information is present in the context, otherwise say "I couldn't find that in the document." and ask the user did they want to ask something else in which you list related topics based on context. Keep answer concise. 
+    Keep answer concise.
+    """
+    
+    prompt = f"Context:\n{context}\n\nQuestion:\n{question}"
+
+    stream = await client.chat(
+        model=OLLAMA_MODEL,
+        messages=[
+            {"role": "system", "content": system_instruction},
+            {"role": "user", "content": prompt}
+        ],
+        stream=True
+    )
+    async for part in stream:
+        if part['message']['content']:
+            yield part['message']['content']
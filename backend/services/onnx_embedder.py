@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+DEFAULT_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", f"onnx_models/{DEFAULT_MODEL.split('/')[-1]}")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = let onnxruntime decide
+MAX_SEQ_LENGTH = 256  # same truncation as the SentenceTransformer model
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+
+
+def model_dir_for(model_name: str) -> str:
+    """
+    ONNX_MODEL_DIR holds the configured EMBEDDING_MODEL; other models
+    (e.g. a re-index target) are exported next to it.
+    """
+    if model_name == DEFAULT_MODEL:
+        return ONNX_MODEL_DIR
+    return os.path.join(os.path.dirname(ONNX_MODEL_DIR.rstrip("/")), model_name.split("/")[-1])
+
+
+class OnnxEmbedder:
+    """
+    CPU embedding backend that runs an exported (optionally int8-quantized)
+    sentence-transformers model with onnxruntime. Mirrors the parts of the
+    SentenceTransformer API that rag_service uses: mean pooling over the
+    attention mask followed by L2 normalisation, so all-MiniLM-L6-v2 keeps
+    its 384-dim output without importing PyTorch.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = False):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"ONNX model not found at '{model_path}'. "
+                f"Export it first: python -m services.onnx_embedder export{' --quantize' if quantized else ''}"
+            )
+
+        options = ort.SessionOptions()
+        if ONNX_THREADS > 0:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        with open(os.path.join(model_dir, "embedder.json"), "r") as f:
+            self.dimension = json.load(f)["dimension"]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _encode_batch(self, texts: list) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then L2 normalise (the model's Pooling + Normalize modules)
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        pooled = summed / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        Same contract as SentenceTransformer.encode: a 1-D array for a single
+        string, a (n, dim) float32 array for a list.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        batches = [self._encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        embeddings = np.concatenate(batches).astype(np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def export_model(model_name: str = DEFAULT_MODEL, out_dir: str = None, quantize: bool = False):
+    """
+    Exports the transformer of a sentence-transformers model to ONNX, plus its
+    tokenizer, and optionally writes a dynamically int8-quantized copy.
+    Needs torch + sentence-transformers (only at export time).
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = out_dir or model_dir_for(model_name)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    os.makedirs(out_dir, exist_ok=True)
+
+    sample = tokenizer(["An example sentence to trace the graph."], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    model_path = os.path.join(out_dir, MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer),
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            dynamo=False
+        )
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, "tokenizer.json"))
+
+    with open(os.path.join(out_dir, "embedder.json"), "w") as f:
+        json.dump({"model": model_name, "dimension": st_model.get_sentence_embedding_dimension()}, f)
+    print(f"Exported '{model_name}' to {model_path}")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantized_path = os.path.join(out_dir, QUANTIZED_MODEL_FILE)
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        print(f"Quantized model written to {quantized_path}")
+
+
+PARITY_SENTENCES = [
+    "What is photosynthesis?",
+    "Explain Newton's second law of motion with an example.",
+    "Section 4.2: The Krebs cycle produces NADH and FADH2.",
+    "E = mc^2",
+    "List the differences between mitosis and meiosis in a table, including the number of daughter cells.",
+]
+
+
+def parity_check(model_name: str = DEFAULT_MODEL, model_dir: str = ONNX_MODEL_DIR, quantized: bool = False) -> dict:
+    """
+    Compares ONNX embeddings with the PyTorch SentenceTransformer output.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_name, device="cpu").encode(PARITY_SENTENCES, normalize_embeddings=True)
+    candidate = OnnxEmbedder(model_dir, quantized=quantized).encode(PARITY_SENTENCES)
+
+    cosine = (reference * candidate).sum(axis=1)
+    return {
+        "quantized": quantized,
+        "dimension": int(candidate.shape[1]),
+        "min_cosine": round(float(cosine.min()), 6),
+        "max_abs_diff": round(float(np.abs(reference - candidate).max()), 6),
+    }
+
+
+def _max_rss_mb() -> float:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def benchmark(backend: str, model_name: str = DEFAULT_MODEL, model_dir: str = ONNX_MODEL_DIR,
+              n_texts: int = 512, batch_size: int = 64) -> dict:
+    """
+    Load time, single-query latency, batch throughput and peak RSS for one backend.
+    Run each backend in its own process so RSS numbers are not mixed.
+    """
+    start = time.perf_counter()
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name, device="cpu")
+    else:
+        model = OnnxEmbedder(model_dir, quantized=(backend == "onnx-int8"))
+    load_seconds = time.perf_counter() - start
+
+    texts = [f"{PARITY_SENTENCES[i % len(PARITY_SENTENCES)]} ({i})" for i in range(n_texts)]
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm up
+
+    latencies = []
+    for text in texts[:50]:
+        t = time.perf_counter()
+        model.encode(text)
+        latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+
+    t = time.perf_counter()
+    model.encode(texts, batch_size=batch_size)
+    throughput = n_texts / (time.perf_counter() - t)
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "texts_per_sec": round(throughput, 1),
+        "max_rss_mb": round(_max_rss_mb(), 1),
+    }
+
+
+if __name__ == "__main__":
+    # python -m services.onnx_embedder export [--quantize] [--model NAME]
+    # python -m services.onnx_embedder parity [--quantize]
+    # python -m services.onnx_embedder bench [torch|onnx|onnx-int8 ...]
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    args = sys.argv[2:]
+
+    if command == "export":
+        # --model NAME exports another model (e.g. before a re-index), next to ONNX_MODEL_DIR
+        model = args[args.index("--model") + 1] if "--model" in args else DEFAULT_MODEL
+        export_model(model, quantize="--quantize" in args)
+    elif command == "parity":
+        print(parity_check(quantized="--quantize" in args))
+    elif command == "bench":
+        import subprocess
+        for backend in args or ["torch", "onnx", "onnx-int8"]:
+            # Fresh interpreter per backend for a clean import cost and RSS
+            code = f"import json; from services.onnx_embedder import benchmark; print(json.dumps(benchmark({backend!r})))"
+            result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+            print(result.stdout.strip().splitlines()[-1] if result.returncode == 0 else f"{backend}: failed\n{result.stderr}")
+    else:
+        print("Usage: python -m services.onnx_embedder export|parity|bench [options]")
+        sys.exit(1)
@@ -0,0 +1,299 @@
+import os
+import sys
+import time
+import uuid
+import signal
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+PDF_EXTRACTOR = os.getenv("PDF_EXTRACTOR", "pypdf")  # "pypdf" or "pymupdf"
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))  # 0 = extract in-process
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "10"))  # seconds per page, 0 = no limit
+PDF_RANGE_RETRIES = 2  # resubmits of a range whose pool was torn down under it
+PDF_RANGE_POLL_SECONDS = 1.0  # how often a waiting range checks whether its worker has started
+
+
+class PageTimeout(Exception):
+    pass
+
+
+class PdfExtractor:
+    """
+    Text extraction backend. Implementations must be importable in a worker
+    process and cheap to construct, since every page range opens the file again.
+    """
+    name = "base"
+
+    def page_count(self, file_path: str) -> int:
+        raise NotImplementedError
+
+    def extract_page(self, file_path: str, page_number: int) -> str:
+        raise NotImplementedError
+
+    def extract_range(self, file_path: str, start: int, end: int):
+        """
+        Yields (page_number, text) for pages [start, end).
+        """
+        for page_number in range(start, end):
+            yield page_number, self.extract_page(file_path, page_number)
+
+
+class PypdfExtractor(PdfExtractor):
+    name = "pypdf"
+
+    def __init__(self):
+        self._path = None
+        self._reader = None
+
+    def _open(self, file_path: str):
+        from pypdf import PdfReader
+        if self._path != file_path:
+            self._reader = PdfReader(file_path)
+            self._path = file_path
+        return self._reader
+
+    def page_count(self, file_path: str) -> int:
+        return len(self._open(file_path).pages)
+
+    def extract_page(self, file_path: str, page_number: int) -> str:
+        return self._open(file_path).pages[page_number].extract_text() or ""
+
+
+class PymupdfExtractor(PdfExtractor):
+    """
+    Optional, much faster backend (pip install pymupdf).
+    """
+    name = "pymupdf"
+
+    def __init__(self):
+        import fitz  # noqa: F401 - fail early if pymupdf is missing
+        self._path = None
+        self._doc = None
+
+    def _open(self, file_path: str):
+        import fitz
+        if self._path != file_path:
+            if self._doc is not None:
+                self._doc.close()
+            self._doc = fitz.open(file_path)
+            self._path = file_path
+        return self._doc
+
+    def page_count(self, file_path: str) -> int:
+        return self._open(file_path).page_count
+
+    def extract_page(self, file_path: str, page_number: int) -> str:
+        return self._open(file_path)[page_number].get_text() or ""
+
+
+EXTRACTORS = {
+    PypdfExtractor.name: PypdfExtractor,
+    PymupdfExtractor.name: PymupdfExtractor,
+}
+
+
+def get_extractor(name: str = PDF_EXTRACTOR) -> PdfExtractor:
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown PDF_EXTRACTOR '{name}' (expected one of {', '.join(EXTRACTORS)})")
+    return EXTRACTORS[name]()
+
+
+def _raise_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _extract_range(backend: str, file_path: str, start: int, end: int, page_timeout: float,
+                   started=None, token: str = None) -> list:
+    """
+    Worker entry point: extracts pages [start, end) and returns their texts.
+    Pages that exceed `page_timeout` seconds are skipped (empty text) and logged.
+    The timeout uses SIGALRM, so it only applies in a process's main thread
+    (pool workers and the command line, not the server's worker threads).
+    `started[token]` records when the worker picked the range up, so the
+    caller's backstop does not count time spent queued behind other ranges.
+    """
+    if started is not None:
+        started[token] = time.time()
+    extractor = get_extractor(backend)
+    use_alarm = (
+        page_timeout > 0
+        and hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    )
+
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_page_timeout)
+
+    texts = []
+    try:
+        for page_number in range(start, end):
+            try:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                texts.append(extractor.extract_page(file_path, page_number))
+            except PageTimeout:
+                print(f"PDF Extraction: page {page_number + 1} of '{file_path}' took over {page_timeout}s, skipped")
+                texts.append("")
+            except Exception as e:
+                print(f"PDF Extraction: page {page_number + 1} of '{file_path}' failed ({e}), skipped")
+                texts.append("")
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous)
+
+    return texts
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_manager = None
+_started = None  # token -> time a worker started the range, shared with the workers
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    Shared, lazily started process pool. Spawned (not forked) so workers do not
+    inherit the server's threads and model weights.
+    """
+    global _pool, _manager, _started
+    with _pool_lock:
+        if _manager is None:
+            _manager = multiprocessing.get_context("spawn").Manager()
+            _started = _manager.dict()
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _wait_for_range(future, token: str, limit: float):
+    """
+    Result of a submitted range. Raises FutureTimeoutError only once the range
+    has run for more than `limit` seconds since its worker started it; time
+    spent queued in the shared pool never counts.
+    """
+    if limit is None:
+        return future.result()
+    while True:
+        try:
+            return future.result(timeout=PDF_RANGE_POLL_SECONDS)
+        except FutureTimeoutError:
+            began = _started.get(token)
+            if began is not None and time.time() - began > limit:
+                raise
+
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    """
+    Tears down a pool with a worker stuck past its deadline: queued ranges are
+    cancelled and every worker is terminated, so the stuck one stops holding a
+    slot. The next _get_pool() starts a fresh pool; ranges that were queued or
+    running on this one fail (cancelled or BrokenProcessPool) and are resubmitted.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout=5)
+
+
+def page_count(file_path: str, backend: str = PDF_EXTRACTOR) -> int:
+    return get_extractor(backend).page_count(file_path)
+
+
+def iter_page_texts(file_path: str, backend: str = PDF_EXTRACTOR, stats: dict = None):
+    """
+    Yields the text of every page in order. Page ranges are extracted in parallel
+    across the process pool with a bounded number of ranges in flight, so memory
+    stays flat for large documents. `stats` (if given) receives pages, seconds
+    and pages_per_sec when extraction finishes.
+    """
+    start_time = time.perf_counter()
+    file_path = os.path.abspath(file_path)  # workers resolve paths on their own
+    total = page_count(file_path, backend)
+    ranges = [(i, min(i + PDF_PAGES_PER_TASK, total)) for i in range(0, total, PDF_PAGES_PER_TASK)]
+
+    if PDF_EXTRACT_WORKERS <= 0:
+        # In-process; the per-page timeout only applies when running in the main thread
+        for text in _extract_range(backend, file_path, 0, total, PDF_PAGE_TIMEOUT):
+            yield text
+    else:
+        # Single-range documents go to the pool too, where the per-page timeout can fire
+        max_in_flight = PDF_EXTRACT_WORKERS * 2
+        pending = []
+        next_range = 0
+
+        def submit(start: int, end: int, retries: int = PDF_RANGE_RETRIES):
+            pool = _get_pool()
+            token = str(uuid.uuid4())
+            args = (_extract_range, backend, file_path, start, end, PDF_PAGE_TIMEOUT, _started, token)
+            try:
+                future = pool.submit(*args)
+            except BrokenProcessPool:
+                # A worker died (crash or reset); replace the pool once
+                _reset_pool(pool)
+                pool = _get_pool()
+                future = pool.submit(*args)
+            return start, end, pool, future, token, retries
+
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < max_in_flight:
+                pending.append(submit(*ranges[next_range]))
+                next_range += 1
+
+            start, end, pool, future, token, retries = pending.pop(0)
+            # Backstop for pages stuck inside native code where the alarm cannot fire
+            limit = (end - start) * PDF_PAGE_TIMEOUT * 2 + 30 if PDF_PAGE_TIMEOUT > 0 else None
+            try:
+                texts = _wait_for_range(future, token, limit)
+            except FutureTimeoutError:
+                # This range's worker is stuck (queue time excluded); free its slot
+                print(f"PDF Extraction: pages {start + 1}-{end} of '{file_path}' timed out, skipped")
+                texts = [""] * (end - start)
+                _reset_pool(pool)
+            except (BrokenProcessPool, CancelledError):
+                # The pool was reset under this range (a stuck range here or in another document)
+                _reset_pool(pool)
+                if retries > 0:
+                    pending.insert(0, submit(start, end, retries - 1))
+                    continue
+                print(f"PDF Extraction: pages {start + 1}-{end} of '{file_path}' failed (worker pool reset), skipped")
+                texts = [""] * (end - start)
+            finally:
+                _started.pop(token, None)
+            for text in texts:
+                yield text
+
+    elapsed = time.perf_counter() - start_time
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"Extracted {total} pages from '{file_path}' with {backend} in {elapsed:.2f}s ({rate:.1f} pages/s)")
+    if stats is not None:
+        stats.update({"pages": total, "seconds": round(elapsed, 3), "pages_per_sec": round(rate, 1)})
+
+
+if __name__ == "__main__":
+    # Extraction benchmark: python -m services.pdf_extractor path/to/file.pdf [backend]
+    if len(sys.argv) < 2:
+        print("Usage: python -m services.pdf_extractor <file.pdf> [pypdf|pymupdf]")
+        sys.exit(1)
+    result = {}
+    for _ in iter_page_texts(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else PDF_EXTRACTOR, stats=result):
+        pass
+    print(result)
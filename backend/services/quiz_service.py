@@ -0,0 +1,118 @@
+import os
+import uuid
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models.quiz_model import QuizModel, QUIZ_STATUS_READY, QUIZ_STATUS_FAILED
+from models.question_model import Question
+from models.ai_responses import AIResponse
+from services.llm_provider import get_provider
+from services.tutor_cache import tutor_cache, TUTOR_CACHE_ENABLED
+from starlette.concurrency import run_in_threadpool
+
+load_dotenv()
+
+# Configuration
+QUIZ_TOPIC_MAX_CHARS = int(os.getenv("QUIZ_TOPIC_MAX_CHARS", "80"))  # provisional topic (the question) until the quiz names one
+
+
+def provisional_topic(question: str) -> str:
+    question = " ".join(question.split())
+    if len(question) <= QUIZ_TOPIC_MAX_CHARS:
+        return question
+    return question[:QUIZ_TOPIC_MAX_CHARS - 3].rstrip() + "..."
+
+
+def create_quiz(db: Session, user_id: str, topic: str, status: str = QUIZ_STATUS_READY) -> QuizModel:
+    """
+    Adds a quiz row (not committed); its questions follow via add_questions.
+    """
+    quiz = QuizModel(
+        id=str(uuid.uuid4()),
+        topic=topic,
+        created_by=user_id,
+        status=status
+    )
+    db.add(quiz)
+    return quiz
+
+
+def add_questions(db: Session, quiz_id: str, quiz_data: dict):
+    """
+    Adds the question rows of a generated quiz ({"1": {question, options, answer, difficulty}, ...}), not committed.
+    """
+    for question_number, item in quiz_data.items():
+        answer = item["answer"]
+        db.add(Question(
+            id=str(uuid.uuid4()),
+            quiz_id=quiz_id,
+            question_number=question_number,
+            question_text=item["question"],
+            option_1=item["options"]["1"],
+            option_2=item["options"]["2"],
+            option_3=item["options"]["3"],
+            option_4=item["options"]["4"],
+            correct_option=int(answer) if isinstance(answer, str) else answer,
+            difficulty=item["difficulty"]
+        ))
+
+
+def _complete_quiz(quiz_id: str, generated: dict, update_topic: bool):
+    with SessionLocal() as db:
+        quiz = db.query(QuizModel).filter(QuizModel.id == quiz_id).first()
+        if quiz is None:
+            return
+        try:
+            add_questions(db, quiz_id, generated.get("quiz") or {})
+            if update_topic and generated.get("topic"):
+                quiz.topic = generated["topic"]
+                db.query(AIResponse).filter(AIResponse.quiz_id == quiz_id).update(
+                    {AIResponse.topic: generated["topic"]}, synchronize_session=False
+                )
+            quiz.status = QUIZ_STATUS_READY
+            quiz.error = None
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+
+def _fail_quiz(quiz_id: str, error: str):
+    with SessionLocal() as db:
+        db.query(QuizModel).filter(QuizModel.id == quiz_id).update(
+            {QuizModel.status: QUIZ_STATUS_FAILED, QuizModel.error: error}, synchronize_session=False
+        )
+        db.commit()
+
+
+async def build_quiz(quiz_id: str, question: str, response: dict, update_topic: bool = False):
+    """
+    Background task: generates the quiz for an answer already returned to the
+    user, saves its questions and marks the pending quiz ready (or failed, with
+    the error). `update_topic` replaces the provisional topic with the one the
+    quiz generation names. The completed response is then cached.
+    """
+    provider = get_provider()
+    try:
+        generated = await provider.generate_quiz(question, response.get("answer", ""))
+        if not generated.get("quiz"):
+            raise ValueError("quiz generation returned no questions")
+        await run_in_threadpool(_complete_quiz, quiz_id, generated, update_topic)
+    except Exception as e:
+        print(f"Quiz Generation Error ({quiz_id}): {e}")
+        await run_in_threadpool(_fail_quiz, quiz_id, getattr(e, "detail", None) or str(e))
+        return
+
+    if TUTOR_CACHE_ENABLED:
+        topic = generated.get("topic") if update_topic else None
+        completed = {
+            **response,
+            "topic": topic or response.get("topic"),
+            "field": response.get("field") or generated.get("field"),
+            "quiz": generated["quiz"],
+        }
+        try:
+            await run_in_threadpool(tutor_cache.store, question, completed, quiz_id, provider.name)
+        except Exception as e:
+            print(f"Tutor Cache Error: {e}")
+
@@ -1,93 +1,514 @@
 import os
 import time
-from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
-from pypdf import PdfReader
+import hashlib
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
+from services.vector_store import get_vector_store
+from core.cache import LRUCache
+from services.embedding_cache import ChunkEmbeddingCache
+from services import pdf_extractor
+from services import bm25_index
+from services.chunk_store import ChunkStoreWriter, get_chunk_store, write_document_text
+from services.token_utils import count_tokens
+from services.chunker import chunk_text, CHUNKER_VERSION
+from core.metrics import LatencyTracker
 
 load_dotenv()
 
-# Configuration
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-INDEX_NAME = "ai-tutor" 
+# Initialize Embedding Model
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()  # torch, onnx or onnx-int8
+
+def embedding_version(model_name: str, backend: str) -> str:
+    """
+    Identifies vectors produced by a model/backend pair. ONNX fp32 matches
+    PyTorch, but int8 vectors are slightly different and must not share caches.
+    """
+    return f"{model_name}+int8" if backend == "onnx-int8" else model_name
+
+EMBEDDING_VERSION = embedding_version(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+
+def load_embedding_model(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND):
+    """
+    Loads the encoder for a model and backend. The ONNX backends avoid importing PyTorch.
+    """
+    if backend in ("onnx", "onnx-int8"):
+        from services.onnx_embedder import OnnxEmbedder, model_dir_for
+        return OnnxEmbedder(model_dir_for(model_name), quantized=(backend == "onnx-int8"))
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected torch, onnx or onnx-int8)")
+
+embed_model = load_embedding_model()
+EMBEDDING_DIM = embed_model.get_sentence_embedding_dimension()
+
+# Vector backend (Pinecone or local memory-mapped store, see VECTOR_STORE)
+vector_store = get_vector_store(dimension=EMBEDDING_DIM)
+
+# Retrieval
+TOP_K = 3
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"  # fuse BM25 keyword hits with vector hits
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "6"))  # per retriever, before fusion
+RRF_K = 60
+
+# Context packing: best non-redundant chunks up to a token budget per LLM call
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "480"))  # about TOP_K chunks; 0 = fixed TOP_K chunks
+CONTEXT_REDUNDANCY = float(os.getenv("CONTEXT_REDUNDANCY", "0.8"))  # word overlap that makes a chunk a repeat
+
+# Adaptive context: documents whose whole text fits this many tokens skip retrieval
+ADAPTIVE_CONTEXT = os.getenv("ADAPTIVE_CONTEXT", "1") == "1"
+FULL_CONTEXT_MAX_TOKENS = int(os.getenv("FULL_CONTEXT_MAX_TOKENS", "4000"))
+
+# Per-request latency of PDF chat, by path taken (full_context / rag)
+chat_latency = LatencyTracker()
+
+# Micro-batching of concurrent query embeddings
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+class EmbeddingBatcher:
+    """
+    Collects single-text encode requests from concurrent callers, runs them as
+    one batched `encode` call and hands each caller its own vector.
+    A batch is flushed when it reaches `max_batch_size` items or `max_wait_ms`
+    after its first item arrived.
+    """
+
+    def __init__(self, model, max_batch_size: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def encode(self, text: str) -> list:
+        """
+        Blocks until the batch containing `text` has been encoded.
+        """
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())  # take whatever is already waiting
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.model.encode(texts, batch_size=len(texts))
+                for (_, future), embedding in zip(batch, embeddings):
+                    future.set_result(embedding.tolist())
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+query_embedder = EmbeddingBatcher(embed_model)
+
+# Documents not yet re-indexed to EMBEDDING_VERSION are queried with their own model
+query_embedders = {EMBEDDING_VERSION: query_embedder}
+_query_embedders_lock = threading.Lock()
+
+def get_query_embedder(version: str) -> EmbeddingBatcher:
+    """
+    Returns the batcher for an embedding version, loading its model on first use.
+    """
+    embedder = query_embedders.get(version)
+    if embedder is None:
+        with _query_embedders_lock:
+            embedder = query_embedders.get(version)
+            if embedder is None:
+                model_name = version[:-len("+int8")] if version.endswith("+int8") else version
+                if version.endswith("+int8"):
+                    backend = "onnx-int8"
+                else:
+                    backend = "onnx" if EMBEDDING_BACKEND.startswith("onnx") else "torch"
+                print(f"Loading query encoder for embedding version '{version}' ({backend})")
+                embedder = EmbeddingBatcher(load_embedding_model(model_name, backend))
+                query_embedders[version] = embedder
+    return embedder
+
+# Query embedding cache (repeat questions skip the encoder entirely)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))  # seconds, 0 = never expire
+query_embedding_cache = LRUCache(max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
+# Ingestion tuning (all chunks of a document never sit in memory at once)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+
+def count_pages(file_path: str) -> int:
+    """
+    Returns the number of pages without extracting any text.
+    """
+    return pdf_extractor.page_count(file_path)
+
+def iter_pages(file_path: str, stats: dict = None):
+    """
+    Yields the text of each page, one page at a time
+    (extracted in parallel by the configured PDF_EXTRACTOR).
+    """
+    for page_text in pdf_extractor.iter_page_texts(file_path, stats=stats):
+        yield page_text + "\n"
+
+def chunk_page(page_text: str) -> list:
+    """
+    Cuts one page into sentence-aligned, overlapping chunks of about
+    CHUNK_TARGET_TOKENS. Chunks never straddle pages, so a chunk id
+    (p{page}_c{index}) stays stable as long as its page is unchanged.
+    """
+    return chunk_text(page_text)
+
+def page_chunk_id(page: int, index: int) -> str:
+    return f"p{page}_c{index}"
+
+def page_hash(page_text: str) -> str:
+    # Includes the chunker settings: pages chunked differently must be re-embedded
+    return hashlib.sha256(f"{CHUNKER_VERSION}\n{page_text}".encode("utf-8")).hexdigest()[:32]
+
+def batched(iterable, size: int):
+    """
+    Groups an iterable into lists of at most `size` items.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def process_pdf(file_path: str, namespace: str, on_progress=None, previous_pages: list = None):
+    """
+    Reads PDF, chunks text, creates embeddings, uploads to the vector store.
+    Pages are streamed through the chunker, embedded EMBED_BATCH_SIZE chunks
+    per encode call and upserted UPSERT_BATCH_SIZE vectors at a time.
+    Chunks already in the persistent embedding cache are not re-encoded.
+    Documents of at most FULL_CONTEXT_MAX_TOKENS also keep their full text
+    for full-context answers.
+
+    `previous_pages` is the page_hashes list of the last ingest into this
+    namespace ([[hash, chunk_count], ...]). When given, only pages whose hash
+    changed are re-embedded and upserted, and vectors of removed chunks are deleted.
+    `on_progress(pages, chunks)` is called after every embedded batch.
+    """
+    start = time.perf_counter()
+    incremental = previous_pages is not None
+    previous_pages = previous_pages or []
+    chunk_count = 0
+    embedded_count = 0
+    page_count = 0
+    pages_changed = 0
+    page_hashes = []
+    stale_ids = []
+    pending = []
+    extract_stats = {}
+    token_count = 0
+    full_text = []  # dropped as soon as the document exceeds the full-context budget
+    embedding_cache = ChunkEmbeddingCache(EMBEDDING_VERSION)
+    keyword_index = bm25_index.BM25Builder()
+    text_store = ChunkStoreWriter(namespace, append=incremental)
 
-# Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY)
+    def encode_batch(texts):
+        return embed_model.encode(texts, batch_size=EMBED_BATCH_SIZE)
 
-# Check if index exists, if not, create it
-existing_indexes = [index.name for index in pc.list_indexes()]
+    def changed_chunks():
+        """
+        Yields (page, chunk_id, text) for every chunk that needs embedding.
+        """
+        nonlocal page_count, chunk_count, pages_changed, token_count, full_text
+        for page_text in iter_pages(file_path, stats=extract_stats):
+            page_count += 1
+            token_count += count_tokens(page_text)
+            if full_text is not None:
+                full_text.append(page_text)
+                if token_count > FULL_CONTEXT_MAX_TOKENS:
+                    full_text = None
+            digest = page_hash(page_text)
+            chunks = chunk_page(page_text)
+            page_hashes.append([digest, len(chunks)])
+            chunk_count += len(chunks)
+
+            # BM25 is rebuilt from all pages; it is cheap compared to embedding
+            for index, chunk in enumerate(chunks):
+                keyword_index.add(page_chunk_id(page_count, index), chunk)
+
+            previous = previous_pages[page_count - 1] if page_count <= len(previous_pages) else None
+            if incremental and previous is not None and previous[0] == digest:
+                continue  # unchanged page: vectors and stored text are still valid
+
+            pages_changed += 1
+            if previous is not None:
+                for index in range(len(chunks), previous[1]):
+                    stale_ids.append(page_chunk_id(page_count, index))
+            for index, chunk in enumerate(chunks):
+                yield page_count, page_chunk_id(page_count, index), chunk
 
-if INDEX_NAME not in existing_indexes:
-    print(f"Index '{INDEX_NAME}' not found. Creating it...")
     try:
-        pc.create_index(
-            name=INDEX_NAME,
-            dimension=384, # Match embedding model dimensions
-            metric="cosine",
-            spec=ServerlessSpec(
-                cloud="aws",
-                region="us-east-1"
-            )
-        )
-        
-        while not pc.describe_index(INDEX_NAME).status['ready']:
-            time.sleep(1)
-
-        print(f"Index '{INDEX_NAME}' created successfully!")
-    except Exception as e:
-        print(f"Error creating index: {e}")
-        print("Please create the index 'ai-tutor' manually in the Pinecone console with dimension 384.")
-
-# Connect to the index
-index = pc.Index(INDEX_NAME)
+        for batch in batched(changed_chunks(), EMBED_BATCH_SIZE):
+            embeddings = embedding_cache.encode([chunk for _, _, chunk in batch], encode_batch)
+            for (page, vector_id, chunk), embedding in zip(batch, embeddings):
+                # Text lives in the local chunk store; vectors only carry where to find it
+                start_offset, end_offset = text_store.add(vector_id, page, chunk)
+                pending.append({
+                    "id": vector_id,
+                    "values": embedding,
+                    "metadata": {"page": page, "start": start_offset, "end": end_offset, "model": EMBEDDING_VERSION}
+                })
+            embedded_count += len(batch)
 
-# Initialize Embedding Model
-embed_model = SentenceTransformer('all-MiniLM-L6-v2') 
-
-def process_pdf(file_path: str, namespace: str):
-    """
-    Reads PDF, chunks text, creates embeddings, uploads to Pinecone.
-    """
-    # Extract Text
-    reader = PdfReader(file_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() + "\n"
-    
-    # Chunk Text
-    chunk_size = 500
-    chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-    
-    # Generate Embeddings
-    vectors = []
-    for i, chunk in enumerate(chunks):
-        embedding = embed_model.encode(chunk).tolist()
-        vectors.append({
-            "id": f"chunk_{i}",
-            "values": embedding,
-            "metadata": {"text": chunk}
+            if on_progress:
+                on_progress(page_count, chunk_count)
+
+            # Flush full upsert batches, keep the remainder for the next round
+            while len(pending) >= UPSERT_BATCH_SIZE:
+                vector_store.upsert(pending[:UPSERT_BATCH_SIZE], namespace)
+                pending = pending[UPSERT_BATCH_SIZE:]
+
+        if pending:
+            vector_store.upsert(pending, namespace)
+
+        # Pages that no longer exist in the new version
+        for page in range(page_count + 1, len(previous_pages) + 1):
+            stale_ids.extend(page_chunk_id(page, index) for index in range(previous_pages[page - 1][1]))
+        if stale_ids:
+            vector_store.delete(stale_ids, namespace)
+            for vector_id in stale_ids:
+                text_store.remove(vector_id)
+
+        keyword_index.save(namespace)
+        text_store.close()
+        write_document_text(namespace, "".join(full_text) if full_text is not None else None)
+    except Exception:
+        text_store.abort()
+        raise
+    finally:
+        embedding_cache.close()
+
+    elapsed = time.perf_counter() - start
+    rate = embedded_count / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Ingested {embedded_count}/{chunk_count} chunks ({pages_changed}/{page_count} pages changed) "
+        f"into '{namespace}' in {elapsed:.2f}s ({rate:.1f} chunks/s), "
+        f"embedding cache hit ratio {embedding_cache.hit_ratio:.0%}"
+    )
+
+    return {
+        "pages": page_count,
+        "pages_changed": pages_changed,
+        "chunks": chunk_count,
+        "chunks_embedded": embedded_count,
+        "chunks_deleted": len(stale_ids),
+        "tokens": token_count,
+        "page_hashes": page_hashes,
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(rate, 1),
+        "pages_per_sec": extract_stats.get("pages_per_sec", 0.0),
+        "cache_hits": embedding_cache.hits,
+        "cache_misses": embedding_cache.misses,
+        "cache_hit_ratio": embedding_cache.hit_ratio
+    }
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key form of a query: lowercased, whitespace collapsed. Only used as
+    a key; the MiniLM tokenizer is uncased, so queries that differ in case or
+    spacing alone share an embedding.
+    """
+    return " ".join(query.lower().split())
+
+def embed_query(query: str, version: str = EMBEDDING_VERSION) -> list:
+    """
+    Returns the query embedding for an embedding version, served from the LRU cache when possible.
+    The encoder always sees the query as the user wrote it.
+    """
+    key = (version, normalize_query(query))
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = get_query_embedder(version).encode(query)
+        query_embedding_cache.set(key, embedding)
+    return embedding
+
+def _search_namespace(query: str, query_emb: list, namespace: str, candidates: int) -> tuple:
+    """
+    Dense (and BM25 when HYBRID_SEARCH is on) candidates of one namespace:
+    ([(chunk_id, cosine)], [(chunk_id, bm25 score)], {chunk_id: metadata}).
+    """
+    results = vector_store.query(query_emb, namespace, top_k=candidates, include_metadata=True)
+    dense = [(match['id'], match['score']) for match in results['matches']]
+    metadata = {match['id']: match['metadata'] for match in results['matches']}
+    # Exact terms (formula names, section numbers, acronyms) via BM25
+    keyword = bm25_index.search(namespace, query, top_k=candidates) if HYBRID_SEARCH else []
+    return dense, keyword, metadata
+
+def _resolve_hits(namespace: str, chunk_ids: list, metadata: dict) -> list:
+    """
+    Looks up text and page for chunk ids of one namespace; drops ids with no text.
+    """
+    # Resolve text from the local chunk store (zero-copy slices of the mapped blob)
+    store = get_chunk_store(namespace)
+    hits = []
+    missing = []
+    for chunk_id in chunk_ids:
+        text = store.get(chunk_id) if store else metadata.get(chunk_id, {}).get('text')
+        if text is None:
+            missing.append(chunk_id)
+        hits.append({
+            "chunk_id": chunk_id,
+            "page": store.page(chunk_id) if store else metadata.get(chunk_id, {}).get('page'),
+            "text": text
         })
-    
-    # Upsert to Pinecone
-    index.upsert(vectors=vectors, namespace=namespace)
-    
-    return len(chunks)
 
-def query_rag(query: str, namespace: str):
+    if missing:
+        # Documents indexed before the chunk store kept text in vector metadata
+        fetched = vector_store.fetch(missing, namespace)
+        for hit in hits:
+            if hit["text"] is None and hit["chunk_id"] in fetched:
+                hit["text"] = fetched[hit["chunk_id"]]['metadata'].get('text')
+
+    return [hit for hit in hits if hit["text"] is not None]
+
+def _word_set(text: str) -> set:
+    return set(bm25_index.tokenize(text))
+
+def pack_context(hits: list, token_budget: int = CONTEXT_TOKEN_BUDGET, redundancy: float = CONTEXT_REDUNDANCY) -> list:
+    """
+    Keeps hits in rank order while they fit `token_budget`, skipping chunks
+    whose words mostly repeat an already packed chunk (overlap, repeated
+    headers). A hit that does not fit is skipped so a smaller one can still use
+    the room. Each packed hit gets a "tokens" count.
+    """
+    packed = []
+    packed_words = []
+    used = 0
+    for hit in hits:
+        tokens = count_tokens(hit["text"])
+        if used + tokens > token_budget:
+            continue
+        words = _word_set(hit["text"])
+        if any(len(words & seen) >= redundancy * max(min(len(words), len(seen)), 1) for seen in packed_words):
+            continue
+        packed.append({**hit, "tokens": tokens})
+        packed_words.append(words)
+        used += tokens
+    return packed
+
+def retrieve_chunks(query: str, namespace: str, top_k: int = TOP_K, version: str = EMBEDDING_VERSION,
+                    token_budget: int = CONTEXT_TOKEN_BUDGET) -> list:
+    """
+    Embeds query with the namespace's embedding version, searches the vector
+    store (fused with BM25 keyword hits when HYBRID_SEARCH is on) and returns
+    the best chunks as [{"chunk_id", "page", "text"}, ...], best first.
+    With a `token_budget` the candidates are packed up to that many tokens
+    (see pack_context) instead of cutting at `top_k`.
+    """
+    candidates = max(RETRIEVAL_CANDIDATES, top_k) if (HYBRID_SEARCH or token_budget) else top_k
+    query_emb = embed_query(query, version)
+    dense, keyword, metadata = _search_namespace(query, query_emb, namespace, candidates)
+
+    ranked_ids = [chunk_id for chunk_id, _ in dense]
+    if HYBRID_SEARCH:
+        ranked_ids = bm25_index.reciprocal_rank_fusion([ranked_ids, [chunk_id for chunk_id, _ in keyword]], k=RRF_K)
+
+    if token_budget:
+        return pack_context(_resolve_hits(namespace, ranked_ids, metadata), token_budget)
+    return _resolve_hits(namespace, ranked_ids[:top_k], metadata)
+
+# Library search (all documents of a user)
+LIBRARY_SEARCH_WORKERS = int(os.getenv("LIBRARY_SEARCH_WORKERS", "8"))  # namespaces searched at once
+LIBRARY_CANDIDATES = int(os.getenv("LIBRARY_CANDIDATES", "5"))  # per namespace and retriever
+library_pool = ThreadPoolExecutor(max_workers=LIBRARY_SEARCH_WORKERS, thread_name_prefix="library-search")
+
+def retrieve_library(query: str, namespaces: dict, top_k: int = TOP_K, token_budget: int = CONTEXT_TOKEN_BUDGET) -> list:
     """
-    Embeds query, searches Pinecone, returns context text.
-    """
-    # Embed Query
-    query_emb = embed_model.encode(query).tolist()
-    
-    # Search Pinecone
-    results = index.query(
-        namespace=namespace,
-        vector=query_emb,
-        top_k=3,
-        include_metadata=True
+    Searches several namespaces ({namespace: embedding version}) with one query
+    embedding per version and returns the merged best chunks as
+    [{"namespace", "chunk_id", "page", "text"}, ...], best first.
+    Namespaces are searched concurrently on a bounded pool. Dense hits are ranked
+    globally by cosine and BM25 hits by score, then fused with RRF, so a document
+    only wins slots by having better chunks, not by being searched at all.
+    """
+    query_embs = {version: embed_query(query, version) for version in set(namespaces.values())}
+    candidates = max(LIBRARY_CANDIDATES, top_k)
+    futures = {
+        namespace: library_pool.submit(_search_namespace, query, query_embs[version], namespace, candidates)
+        for namespace, version in namespaces.items()
+    }
+
+    dense, keyword, metadata = [], [], {}
+    for namespace, future in futures.items():
+        try:
+            ns_dense, ns_keyword, ns_metadata = future.result()
+        except Exception as e:
+            # One broken document should not fail the whole library search
+            print(f"Library search skipped namespace '{namespace}': {e}")
+            continue
+        dense.extend(((namespace, chunk_id), score) for chunk_id, score in ns_dense)
+        keyword.extend(((namespace, chunk_id), score) for chunk_id, score in ns_keyword)
+        metadata[namespace] = ns_metadata
+
+    ranked = [key for key, _ in sorted(dense, key=lambda item: item[1], reverse=True)]
+    if HYBRID_SEARCH:
+        keyword_ranked = [key for key, _ in sorted(keyword, key=lambda item: item[1], reverse=True)]
+        ranked = bm25_index.reciprocal_rank_fusion([ranked, keyword_ranked], k=RRF_K)
+    if token_budget:
+        ranked = ranked[:max(RETRIEVAL_CANDIDATES, top_k)]
+    else:
+        ranked = ranked[:top_k]
+
+    # Resolve text per namespace, then restore the global order
+    by_namespace = {}
+    for namespace, chunk_id in ranked:
+        by_namespace.setdefault(namespace, []).append(chunk_id)
+    resolved = {}
+    for namespace, chunk_ids in by_namespace.items():
+        for hit in _resolve_hits(namespace, chunk_ids, metadata[namespace]):
+            resolved[(namespace, hit["chunk_id"])] = {"namespace": namespace, **hit}
+    hits = [resolved[key] for key in ranked if key in resolved]
+    return pack_context(hits, token_budget) if token_budget else hits
+
+def format_context(hits: list) -> str:
+    """
+    Joins chunk texts; hits that carry a "source" (library search) are labelled with it.
+    """
+    return "\n".join(
+        f"[{hit['source']}, page {hit['page']}]\n{hit['text']}" if hit.get("source") else hit["text"]
+        for hit in hits
     )
-    
-    # Extract Text Context
-    context_text = "\n".join([match['metadata']['text'] for match in results['matches']])
-    return context_text
\ No newline at end of file
+
+def query_rag(query: str, namespace: str):
+    """
+    Embeds query, searches the vector store, returns context text.
+    """
+    return format_context(retrieve_chunks(query, namespace))
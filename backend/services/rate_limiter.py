@@ -0,0 +1,224 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from dotenv import load_dotenv
+from core.metrics import LatencyTracker
+
+load_dotenv()
+
+# Configuration: per-provider quotas (0 = unlimited), overridable as LLM_RPM_<PROVIDER> / LLM_TPM_<PROVIDER>
+DEFAULT_QUOTAS = {
+    "groq": (30, 12000),      # llama-3.3-70b-versatile free tier
+    "gemini": (10, 250000),   # gemini-2.5-flash free tier
+    "ollama": (0, 0),         # local
+}
+RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_BACKOFF = float(os.getenv("LLM_RATE_LIMIT_BACKOFF", "5"))  # seconds to pause on a 429 without Retry-After
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class RateLimitExceeded(Exception):
+    """
+    The call cannot start within its deadline without exceeding the provider quota.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_duration(value: str):
+    """
+    Seconds in a rate-limit reset header: "7.66s", "2m59.56s", "120ms" or plain "12".
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """
+    Bucket of `capacity` units refilled at `capacity` per minute. Reservations
+    may drive the level negative: the deficit is the queue ahead, so each new
+    caller waits behind everyone who reserved before it (FIFO).
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        self.refill(now)
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self.level = min(self.capacity, self.level + min(amount, self.capacity))
+
+    def resize(self, per_minute: float, now: float):
+        self.refill(now)
+        self.level = min(self.level, per_minute)
+        self.capacity = float(per_minute)
+
+
+class ProviderRateLimiter:
+    """
+    Client-side limiter for one provider: a request bucket (RPM) and a token
+    bucket (TPM, estimated prompt + completion tokens). acquire() reserves
+    both and sleeps until the reservation is due, or raises RateLimitExceeded
+    at once if that would run past the caller's deadline. observe() adapts to
+    the provider's rate-limit headers: the token limit resizes its bucket,
+    remaining counts clamp the buckets (other workers share the quota) and a
+    429 pauses all calls until its Retry-After.
+    """
+
+    def __init__(self, name: str, rpm: float, tpm: float):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.blocked_until = 0.0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.throttled = 0
+        self.waits = LatencyTracker()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int, deadline: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.blocked_until - now)
+            if self.requests:
+                wait = max(wait, self.requests.wait_for(1, now))
+            if self.tokens:
+                wait = max(wait, self.tokens.wait_for(tokens, now))
+            if now + wait > deadline:
+                self.shed += 1
+                raise RateLimitExceeded(
+                    f"rate limit reached, next slot in {wait:.1f}s", retry_after=wait
+                )
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+            self.admitted += 1
+            return wait
+
+    def _release(self, tokens: int):
+        with self._lock:
+            if self.requests:
+                self.requests.give_back(1)
+            if self.tokens:
+                self.tokens.give_back(tokens)
+
+    async def acquire(self, tokens: int, deadline: float):
+        """
+        Waits for a slot for one request of about `tokens` tokens.
+        `deadline` is a time.monotonic() timestamp.
+        """
+        if not RATE_LIMIT_ENABLED or (self.requests is None and self.tokens is None and not self.blocked_until):
+            return
+        wait = self._reserve(tokens, deadline)
+        self.waits.record("wait", wait * 1000)
+        if wait <= 0:
+            return
+        self.queued += 1
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # Give the slot to the callers behind
+            self._release(tokens)
+            raise
+        finally:
+            self.queued -= 1
+
+    def observe(self, status_code: int, headers):
+        """
+        Adapts to a provider response (x-ratelimit-* and retry-after headers).
+        """
+        now = time.monotonic()
+        with self._lock:
+            limit_tokens = headers.get("x-ratelimit-limit-tokens")
+            if limit_tokens and limit_tokens.isdigit():
+                if self.tokens is None:
+                    self.tokens = TokenBucket(int(limit_tokens))
+                elif int(limit_tokens) != self.tokens.capacity:
+                    self.tokens.resize(int(limit_tokens), now)
+
+            for bucket, remaining, reset in (
+                (self.tokens, "x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens"),
+                (self.requests, "x-ratelimit-remaining-requests", "x-ratelimit-reset-requests"),
+            ):
+                value = headers.get(remaining)
+                if value is None or not value.isdigit():
+                    continue
+                if bucket is not None:
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, int(value))
+                if int(value) == 0:
+                    self.blocked_until = max(self.blocked_until, now + (parse_duration(headers.get(reset)) or 0))
+
+            if status_code == 429:
+                self.throttled += 1
+                retry_after = parse_duration(headers.get("retry-after")) or RATE_LIMIT_BACKOFF
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            for bucket in (self.requests, self.tokens):
+                if bucket:
+                    bucket.refill(now)
+            return {
+                "rpm": self.requests.capacity if self.requests else None,
+                "tpm": self.tokens.capacity if self.tokens else None,
+                "requests_available": round(self.requests.level, 2) if self.requests else None,
+                "tokens_available": round(self.tokens.level) if self.tokens else None,
+                "blocked_for_s": round(max(0.0, self.blocked_until - now), 2),
+                "queued": self.queued,
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "upstream_429s": self.throttled,
+                "wait": self.waits.stats().get("wait"),
+            }
+
+
+def _quota(name: str):
+    rpm, tpm = DEFAULT_QUOTAS.get(name, (0, 0))
+    return (
+        float(os.getenv(f"LLM_RPM_{name.upper()}", rpm)),
+        float(os.getenv(f"LLM_TPM_{name.upper()}", tpm)),
+    )
+
+
+rate_limiters = {name: ProviderRateLimiter(name, *_quota(name)) for name in DEFAULT_QUOTAS}
+
+
+def get_rate_limiter(name: str) -> ProviderRateLimiter:
+    limiter = rate_limiters.get(name)
+    if limiter is None:
+        limiter = rate_limiters[name] = ProviderRateLimiter(name, *_quota(name))
+    return limiter
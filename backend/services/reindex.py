@@ -0,0 +1,248 @@
+import os
+import sys
+import time
+import argparse
+from dotenv import load_dotenv
+from database import SessionLocal
+from models.pdf_model import UserPDF, PDF_STATUS_INDEXED
+from services.rag_service import (
+    vector_store,
+    load_embedding_model,
+    embedding_version,
+    batched,
+    EMBEDDING_DIM,
+    EMBEDDING_BACKEND,
+    EMBED_BATCH_SIZE,
+    UPSERT_BATCH_SIZE,
+)
+from services.vector_store import VECTOR_STORE
+from services.embedding_cache import ChunkEmbeddingCache
+from services.chunk_store import ChunkStore, copy_namespace
+from services.ingestion_service import discard_namespace
+from services import bm25_index
+
+load_dotenv()
+
+# Configuration
+REINDEX_MAX_CHUNKS_PER_SEC = float(os.getenv("REINDEX_MAX_CHUNKS_PER_SEC", "0"))  # 0 = no throttle
+PROGRESS_INTERVAL_SECONDS = 5
+
+
+def target_namespace(namespace: str, version: str) -> str:
+    """
+    Namespace holding a document's vectors for `version`: the original
+    {user_id}_{file_id} plus a version suffix (replacing any earlier one).
+    """
+    base = namespace.split("@")[0]
+    slug = "".join(c if c.isalnum() or c in "-_." else "_" for c in version)
+    return f"{base}@{slug}"
+
+
+def plan_reindex(db, version: str) -> list:
+    """
+    One entry per indexed namespace not yet on `version`:
+    {"namespace", "version", "page_hashes", "chunks"}, where "chunks" is None
+    for documents without a chunk store. Rows sharing a namespace (deduplicated
+    uploads) are re-indexed once. Stores are opened one at a time and closed
+    again; reindex_namespace reopens each while it runs.
+    """
+    plan = {}
+    rows = db.query(UserPDF).filter(UserPDF.status == PDF_STATUS_INDEXED).order_by(UserPDF.created_at).all()
+    for pdf in rows:
+        if pdf.embedding_model == version or pdf.pinecone_namespace in plan:
+            continue
+        store = ChunkStore.open(pdf.pinecone_namespace)
+        chunks = None
+        if store is not None:
+            with store:
+                chunks = len(store.table)
+        plan[pdf.pinecone_namespace] = {
+            "namespace": pdf.pinecone_namespace,
+            "version": pdf.embedding_model,
+            "page_hashes": pdf.page_hashes,
+            "chunks": chunks,
+        }
+    return list(plan.values())
+
+
+class Throttle:
+    """
+    Sleeps just enough to keep the average rate at or below `max_per_sec`.
+    """
+
+    def __init__(self, max_per_sec: float):
+        self.max_per_sec = max_per_sec
+        self.start = time.perf_counter()
+        self.count = 0
+
+    def wait(self, n: int):
+        self.count += n
+        if self.max_per_sec > 0:
+            ahead = self.count / self.max_per_sec - (time.perf_counter() - self.start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def reindex_namespace(entry: dict, target: str, encoder, version: str, throttle: Throttle, on_batch=None) -> int:
+    """
+    Re-embeds one document from its chunk store into the `target` namespace.
+    Reads keep using the old namespace until the switch. Returns the chunk count.
+    """
+    store = ChunkStore.open(entry["namespace"])
+    if store is None:
+        raise FileNotFoundError(f"Chunk store of '{entry['namespace']}' disappeared during the re-index")
+    copy_namespace(entry["namespace"], target)
+    bm25_index.copy_index(entry["namespace"], target)
+
+    embedding_cache = ChunkEmbeddingCache(version)
+    pending = []
+    done = 0
+    try:
+        items = sorted(store.table.items(), key=lambda item: item[1][1])  # blob order
+        for batch in batched(items, EMBED_BATCH_SIZE):
+            texts = [store.read(start, end) for _, (_, start, end) in batch]
+            embeddings = embedding_cache.encode(texts, lambda t: encoder.encode(t, batch_size=EMBED_BATCH_SIZE))
+            for (chunk_id, (page, start, end)), embedding in zip(batch, embeddings):
+                pending.append({
+                    "id": chunk_id,
+                    "values": embedding,
+                    "metadata": {"page": page, "start": start, "end": end, "model": version}
+                })
+            while len(pending) >= UPSERT_BATCH_SIZE:
+                vector_store.upsert(pending[:UPSERT_BATCH_SIZE], target)
+                pending = pending[UPSERT_BATCH_SIZE:]
+
+            done += len(batch)
+            throttle.wait(len(batch))
+            if on_batch:
+                on_batch(len(batch))
+        if pending:
+            vector_store.upsert(pending, target)
+    finally:
+        embedding_cache.close()
+        store.close()
+    return done
+
+
+def switch_versions(db, built: list, version: str) -> tuple:
+    """
+    Points every row of each re-indexed document at its new namespace in one
+    transaction. Rows whose document changed since the plan was made are left alone.
+    Returns (switched rows, namespaces that were not switched).
+    """
+    switched = 0
+    stale = []
+    for entry, target in built:
+        query = db.query(UserPDF).filter(
+            UserPDF.pinecone_namespace == entry["namespace"],
+            UserPDF.status == PDF_STATUS_INDEXED,
+            UserPDF.embedding_model == entry["version"] if entry["version"] else UserPDF.embedding_model.is_(None),
+            UserPDF.page_hashes == entry["page_hashes"] if entry["page_hashes"] else UserPDF.page_hashes.is_(None),
+        )
+        count = query.update({"pinecone_namespace": target, "embedding_model": version}, synchronize_session=False)
+        switched += count
+        if not count:
+            stale.append((entry, target))
+    db.commit()
+    return switched, stale
+
+
+def reindex_all(model_name: str, backend: str = EMBEDDING_BACKEND, max_chunks_per_sec: float = REINDEX_MAX_CHUNKS_PER_SEC,
+                delete_old: bool = False, dry_run: bool = False) -> dict:
+    """
+    Re-embeds every indexed document to `model_name`/`backend` in throttled
+    batches, then switches all of them over atomically. Documents without a
+    chunk store (indexed before it existed) are skipped and must be re-uploaded.
+    """
+    version = embedding_version(model_name, backend)
+    db = SessionLocal()
+    try:
+        plan = plan_reindex(db, version)
+        skipped = [entry["namespace"] for entry in plan if entry["chunks"] is None]
+        plan = [entry for entry in plan if entry["chunks"] is not None]
+        total_chunks = sum(entry["chunks"] for entry in plan)
+        print(f"Re-index to '{version}': {len(plan)} documents, {total_chunks} chunks, {len(skipped)} skipped (no chunk store)")
+        if dry_run or not plan:
+            return {"version": version, "documents": len(plan), "chunks": total_chunks, "skipped": skipped}
+
+        encoder = load_embedding_model(model_name, backend)
+        dimension = encoder.get_sentence_embedding_dimension()
+        if VECTOR_STORE == "pinecone" and dimension != EMBEDDING_DIM:
+            raise ValueError(
+                f"'{version}' has dimension {dimension} but the Pinecone index has {EMBEDDING_DIM}; "
+                f"create a new index or use VECTOR_STORE=local"
+            )
+
+        throttle = Throttle(max_chunks_per_sec)
+        progress = {"chunks": 0, "last_report": time.perf_counter()}
+
+        def on_batch(n: int):
+            progress["chunks"] += n
+            now = time.perf_counter()
+            if now - progress["last_report"] >= PROGRESS_INTERVAL_SECONDS:
+                progress["last_report"] = now
+                rate = progress["chunks"] / (now - throttle.start)
+                eta = (total_chunks - progress["chunks"]) / rate if rate else 0.0
+                print(f"Re-index: {done_docs}/{len(plan)} documents, {progress['chunks']}/{total_chunks} chunks "
+                      f"({rate:.1f} chunks/s, ETA {eta:.0f}s)")
+
+        built = []
+        done_docs = 0
+        try:
+            for entry in plan:
+                target = target_namespace(entry["namespace"], version)
+                reindex_namespace(entry, target, encoder, version, throttle, on_batch)
+                built.append((entry, target))
+                done_docs += 1
+        except Exception:
+            # Nothing was switched yet; drop the partial copies
+            for entry, target in built + [(entry, target_namespace(entry["namespace"], version))]:
+                discard_namespace(target)
+            raise
+
+        switched, stale = switch_versions(db, built, version)
+        for entry, target in stale:
+            discard_namespace(target)
+
+        deleted = 0
+        if delete_old:
+            for entry, target in built:
+                if (entry, target) in stale:
+                    continue
+                if not db.query(UserPDF).filter(UserPDF.pinecone_namespace == entry["namespace"]).first():
+                    discard_namespace(entry["namespace"])
+                    deleted += 1
+
+        elapsed = time.perf_counter() - throttle.start
+        stats = {
+            "version": version,
+            "documents": len(built),
+            "rows_switched": switched,
+            "documents_changed_during_reindex": len(stale),
+            "chunks": progress["chunks"],
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(progress["chunks"] / elapsed, 1) if elapsed > 0 else 0.0,
+            "old_namespaces_deleted": deleted,
+            "skipped": skipped,
+        }
+        print(f"Re-index finished: {stats}")
+        return stats
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # python -m services.reindex --model all-mpnet-base-v2 [--backend torch] [--max-rate 200] [--delete-old] [--dry-run]
+    parser = argparse.ArgumentParser(description="Re-embed all indexed PDFs with another embedding model")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--max-rate", type=float, default=REINDEX_MAX_CHUNKS_PER_SEC, help="chunks per second, 0 = unthrottled")
+    parser.add_argument("--delete-old", action="store_true", help="remove the previous vectors after the switch")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        reindex_all(args.model, args.backend, args.max_rate, args.delete_old, args.dry_run)
+    except Exception as e:
+        print(f"Re-index failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,34 @@
+import os
+import math
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")  # tiktoken encoding, close to Llama 3's BPE
+CHARS_PER_TOKEN = 4.0  # fallback estimate for English prose when tiktoken is not installed
+
+
+def _load_encoding():
+    """
+    Optional exact counts (pip install tiktoken); falls back to a character estimate.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception:
+        return None
+
+
+_encoding = _load_encoding()
+
+# Which counter is in use; part of cache keys whose value depends on token counts
+TOKEN_COUNTER = f"tiktoken:{TOKEN_ENCODING}" if _encoding is not None else f"chars/{CHARS_PER_TOKEN:g}"
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import threading
+import unicodedata
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from dotenv import load_dotenv
+from database import SessionLocal
+from models.tutor_cache_model import TutorCacheEntry
+from services.rag_service import embed_query, EMBEDDING_VERSION
+from services.token_utils import count_tokens
+
+load_dotenv()
+
+# Configuration
+TUTOR_CACHE_ENABLED = os.getenv("TUTOR_CACHE_ENABLED", "1") == "1"
+TUTOR_CACHE_MAX_ENTRIES = int(os.getenv("TUTOR_CACHE_MAX_ENTRIES", "5000"))  # rows kept, least recently used evicted first
+TUTOR_CACHE_TTL = float(os.getenv("TUTOR_CACHE_TTL", "604800"))  # seconds (7 days), 0 = never expire
+TUTOR_CACHE_THRESHOLD = float(os.getenv("TUTOR_CACHE_THRESHOLD", "0.93"))  # min cosine for a semantic hit
+TUTOR_CACHE_REUSE_QUIZ = os.getenv("TUTOR_CACHE_REUSE_QUIZ", "1") == "1"  # hits share the stored quiz instead of saving a copy
+TUTOR_CACHE_REFRESH = float(os.getenv("TUTOR_CACHE_REFRESH", "60"))  # seconds between reloads of the semantic index
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Case-, punctuation- and spacing-insensitive form of a question, so
+    "Explain photosynthesis?" and "explain  Photosynthesis" share one entry.
+    """
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def question_key(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class TutorResponseCache:
+    """
+    Persistent cache of /ask-tutor responses in the tutor_response_cache table.
+    A lookup first matches the normalised question exactly, then the closest
+    question embedding above `threshold`. The embeddings of live entries are
+    kept in memory for the semantic search and reloaded every TUTOR_CACHE_REFRESH
+    seconds, so entries written by other workers are found too.
+    Expired rows (TTL) and the least recently used rows beyond `max_entries`
+    are deleted when new responses are stored.
+    """
+
+    def __init__(self, max_entries: int = TUTOR_CACHE_MAX_ENTRIES, ttl: float = TUTOR_CACHE_TTL,
+                 threshold: float = TUTOR_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self.stores = 0
+        self.evictions = 0
+        self._ids = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _cutoff(self):
+        return _utcnow() - timedelta(seconds=self.ttl) if self.ttl else None
+
+    def _live(self, query):
+        cutoff = self._cutoff()
+        return query.filter(TutorCacheEntry.created_at >= cutoff) if cutoff else query
+
+    def _load_index(self, db):
+        rows = self._live(db.query(TutorCacheEntry.id, TutorCacheEntry.vector)).filter(
+            TutorCacheEntry.embedding_model == EMBEDDING_VERSION
+        ).all()
+        ids = [row.id for row in rows]
+        if rows:
+            matrix = np.stack([np.frombuffer(row.vector, dtype="<f4") for row in rows])
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        with self._lock:
+            self._ids, self._matrix, self._loaded_at = ids, matrix, time.monotonic()
+
+    def _add_to_index(self, entry_id: str, vector: np.ndarray):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._ids = self._ids + [entry_id]
+            self._matrix = np.vstack([self._matrix, vector[None, :]]) if self._matrix.size else vector[None, :].copy()
+
+    def _nearest(self, db, vector: np.ndarray):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= TUTOR_CACHE_REFRESH:
+            self._load_index(db)
+        with self._lock:
+            ids, matrix = self._ids, self._matrix
+        if not ids:
+            return None, 0.0
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        return ids[best], float(scores[best])
+
+    @staticmethod
+    def _embed(question: str) -> np.ndarray:
+        vector = np.asarray(embed_query(question, EMBEDDING_VERSION), dtype="<f4")
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, question: str):
+        """
+        Returns {"response", "quiz_id", "match", "similarity"} for a cached
+        answer to `question`, or None. Blocking (database and embedding).
+        """
+        normalized = normalize_question(question)
+        with SessionLocal() as db:
+            entry = self._live(db.query(TutorCacheEntry)).filter(
+                TutorCacheEntry.question_key == question_key(normalized)
+            ).order_by(TutorCacheEntry.last_used_at.desc()).first()
+            match, similarity = "exact", 1.0
+
+            if entry is None:
+                entry_id, similarity = self._nearest(db, self._embed(question))
+                if entry_id is not None and similarity >= self.threshold:
+                    entry = self._live(db.query(TutorCacheEntry)).filter(TutorCacheEntry.id == entry_id).first()
+                match = "semantic"
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry.hits += 1
+            entry.last_used_at = _utcnow()
+            db.commit()
+
+            if match == "exact":
+                self.exact_hits += 1
+            else:
+                self.semantic_hits += 1
+            self.saved_tokens += entry.response_tokens
+            return {
+                "response": json.loads(entry.response),
+                "quiz_id": entry.quiz_id,
+                "match": match,
+                "similarity": round(similarity, 4),
+            }
+
+    def store(self, question: str, response: dict, quiz_id: str = None, provider: str = None):
+        """
+        Caches a freshly generated response (skipped for empty or failed ones)
+        and evicts expired and least recently used entries. Blocking.
+        """
+        if not response.get("answer") or not response.get("quiz"):
+            return
+        normalized = normalize_question(question)
+        vector = self._embed(question)
+        body = json.dumps(response)
+        now = _utcnow()
+        entry = TutorCacheEntry(
+            id=str(uuid.uuid4()),
+            question_key=question_key(normalized),
+            normalized_question=normalized,
+            embedding_model=EMBEDDING_VERSION,
+            vector=vector.tobytes(),
+            response=body,
+            quiz_id=quiz_id,
+            provider=provider,
+            response_tokens=count_tokens(body),
+            created_at=now,
+            last_used_at=now
+        )
+        with SessionLocal() as db:
+            db.add(entry)
+            db.commit()
+            self.stores += 1
+            self._add_to_index(entry.id, vector)
+            self._evict(db)
+
+    def _evict(self, db):
+        evicted = 0
+        cutoff = self._cutoff()
+        if cutoff:
+            evicted += db.query(TutorCacheEntry).filter(TutorCacheEntry.created_at < cutoff).delete(synchronize_session=False)
+
+        excess = db.query(TutorCacheEntry).count() - self.max_entries
+        if excess > 0:
+            oldest = [row.id for row in db.query(TutorCacheEntry.id).order_by(TutorCacheEntry.last_used_at).limit(excess)]
+            evicted += db.query(TutorCacheEntry).filter(TutorCacheEntry.id.in_(oldest)).delete(synchronize_session=False)
+
+        if evicted:
+            db.commit()
+            self.evictions += evicted
+            # Rebuild the semantic index on the next lookup
+            with self._lock:
+                self._loaded_at = None
+
+    def clear(self):
+        with SessionLocal() as db:
+            db.query(TutorCacheEntry).delete()
+            db.commit()
+        with self._lock:
+            self._loaded_at = None
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.semantic_hits
+        total = hits + self.misses
+        return {
+            "enabled": TUTOR_CACHE_ENABLED,
+            "indexed": len(self._ids),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "threshold": self.threshold,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "saved_tokens": self.saved_tokens,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+
+tutor_cache = TutorResponseCache()
@@ -0,0 +1,171 @@
+import os
+import re
+import uuid
+import hashlib
+from contextlib import aclosing
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from starlette.formparsers import MultiPartParser
+
+load_dotenv()
+
+UPLOAD_DIR = "uploads"
+OBJECTS_DIR = os.path.join(UPLOAD_DIR, "objects")
+TMP_DIR = os.path.join(UPLOAD_DIR, "tmp")
+COPY_CHUNK_SIZE = 1024 * 1024  # 1 MB
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "50"))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # boundaries, part headers and small fields around the file
+
+PDF_MAGIC = b"%PDF-"
+MAGIC_SEARCH_BYTES = 1024  # readers accept the header anywhere in the first 1 KB
+# Page objects ("/Type /Page", not "/Type /Pages") in uncompressed object tables
+PAGE_OBJECT_PATTERN = re.compile(rb"/Type\s*/Page(?![A-Za-z])")
+PAGE_PATTERN_OVERLAP = 32  # bytes carried between chunks so a match is never split
+
+os.makedirs(OBJECTS_DIR, exist_ok=True)
+os.makedirs(TMP_DIR, exist_ok=True)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class NotAPdf(Exception):
+    pass
+
+
+def _too_large_message(max_bytes: int) -> str:
+    return f"File exceeds the {max_bytes / (1024 * 1024):g} MB upload limit"
+
+
+def object_path(content_hash: str) -> str:
+    """
+    Location of a stored upload, fanned out by the first two hex digits.
+    """
+    return os.path.join(OBJECTS_DIR, content_hash[:2], f"{content_hash}.pdf")
+
+
+def object_hash(path: str) -> str:
+    """
+    Content hash of a stored upload, from its object path.
+    """
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+async def _limited_body(request, max_bytes: int):
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLarge(_too_large_message(max_bytes - MULTIPART_OVERHEAD_BYTES))
+        yield chunk
+
+
+async def read_upload_form(request, max_bytes: int = MAX_UPLOAD_BYTES):
+    """
+    Parses a multipart upload from the raw request body instead of letting the
+    framework spool the whole file first. Rejects on Content-Length before
+    reading anything, and aborts a body without one (chunked) as soon as it
+    passes `max_bytes`, so at most that much is ever written to the spool.
+    Raises starlette's MultiPartException for malformed bodies. The caller
+    closes the returned form.
+    """
+    limit = max_bytes + MULTIPART_OVERHEAD_BYTES
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit:
+        raise UploadTooLarge(_too_large_message(max_bytes))
+
+    async with aclosing(_limited_body(request, limit)) as body:
+        return await MultiPartParser(request.headers, body, max_files=1, max_fields=10).parse()
+
+
+class _UploadScanner:
+    """
+    Everything computed while the bytes stream past once: size limit,
+    magic-byte check, sha256 and a page count estimate.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.page_objects = 0
+        self._head = b""
+        self._tail = b""
+
+    def update(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(_too_large_message(self.max_bytes))
+
+        if len(self._head) < MAGIC_SEARCH_BYTES:
+            self._head += chunk[:MAGIC_SEARCH_BYTES - len(self._head)]
+            if len(self._head) >= MAGIC_SEARCH_BYTES and PDF_MAGIC not in self._head:
+                raise NotAPdf("File is not a PDF")
+
+        self.digest.update(chunk)
+
+        # Only count matches that end past the carried-over tail, so none is counted twice
+        window = self._tail + chunk
+        self.page_objects += sum(1 for m in PAGE_OBJECT_PATTERN.finditer(window) if m.end() > len(self._tail))
+        self._tail = window[-PAGE_PATTERN_OVERLAP:]
+
+    def finish(self):
+        if PDF_MAGIC not in self._head:
+            raise NotAPdf("File is not a PDF")
+
+    @property
+    def page_count(self):
+        # Page objects packed in compressed object streams are invisible to the scan;
+        # the extractor reports the real count once ingestion starts
+        return self.page_objects or None
+
+
+def _write_chunk(buffer, chunk: bytes):
+    buffer.write(chunk)
+
+
+def _commit_tmp(tmp_path: str, content_hash: str) -> str:
+    path = object_path(content_hash)
+    if os.path.exists(path):
+        os.remove(tmp_path)  # already stored
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return path
+
+
+async def store_upload(upload, max_bytes: int = MAX_UPLOAD_BYTES) -> tuple:
+    """
+    Streams an UploadFile into the content-addressed store in COPY_CHUNK_SIZE chunks.
+    Disk writes run in the threadpool so the event loop never blocks on I/O.
+    Rejects non-PDF bytes on the first chunk and stops as soon as `max_bytes` is passed.
+    Returns (sha256 hex digest, stored path, page count or None). Identical bytes are kept only once.
+    """
+    if getattr(upload, "size", None) and upload.size > max_bytes:
+        raise UploadTooLarge(_too_large_message(max_bytes))
+
+    scanner = _UploadScanner(max_bytes)
+    tmp_path = os.path.join(TMP_DIR, f"{uuid.uuid4()}.part")
+
+    try:
+        buffer = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            while True:
+                chunk = await upload.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                scanner.update(chunk)
+                await run_in_threadpool(_write_chunk, buffer, chunk)
+        finally:
+            await run_in_threadpool(buffer.close)
+        scanner.finish()
+
+        content_hash = scanner.digest.hexdigest()
+        path = await run_in_threadpool(_commit_tmp, tmp_path, content_hash)
+        return content_hash, path, scanner.page_count
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,487 @@
+import os
+import json
+import time
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are not coordinated across processes
+    fcntl = None
+
+load_dotenv()
+
+# Configuration
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone").lower()  # "pinecone" or "local"
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+INDEX_NAME = "ai-tutor"
+EMBEDDING_DIM = 384  # Default embedding dimension (all-MiniLM-L6-v2)
+
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "vector_store")
+LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "float32").lower()  # float32, float16 or int8
+LOCAL_VECTOR_COMPACT_RATIO = float(os.getenv("LOCAL_VECTOR_COMPACT_RATIO", "0.3"))  # deleted fraction that triggers a rewrite
+
+# Rows scored per step, so a query never materialises the whole matrix as float32
+SEARCH_BLOCK_ROWS = 65536
+
+
+class VectorStore(ABC):
+    """
+    Minimal interface shared by every vector backend.
+    Vectors use the Pinecone shape: {"id": str, "values": list[float], "metadata": dict}.
+    """
+
+    @abstractmethod
+    def upsert(self, vectors: list, namespace: str):
+        ...
+
+    @abstractmethod
+    def query(self, vector, namespace: str, top_k: int = 3, include_metadata: bool = True) -> dict:
+        """
+        Returns {"matches": [{"id", "score", "metadata"}, ...]} sorted by score.
+        """
+
+    @abstractmethod
+    def fetch(self, ids: list, namespace: str) -> dict:
+        """
+        Returns {id: {"id", "values", "metadata"}} for the ids that exist.
+        """
+
+    @abstractmethod
+    def delete(self, ids: list, namespace: str):
+        ...
+
+    @abstractmethod
+    def delete_namespace(self, namespace: str):
+        """
+        Removes every vector of a namespace (and its storage).
+        """
+
+
+class PineconeVectorStore(VectorStore):
+    def __init__(self, api_key: str = PINECONE_API_KEY, index_name: str = INDEX_NAME, dimension: int = EMBEDDING_DIM):
+        from pinecone import Pinecone, ServerlessSpec
+
+        pc = Pinecone(api_key=api_key)
+
+        # Check if index exists, if not, create it
+        existing_indexes = [index.name for index in pc.list_indexes()]
+
+        if index_name not in existing_indexes:
+            print(f"Index '{index_name}' not found. Creating it...")
+            try:
+                pc.create_index(
+                    name=index_name,
+                    dimension=dimension,
+                    metric="cosine",
+                    spec=ServerlessSpec(
+                        cloud="aws",
+                        region="us-east-1"
+                    )
+                )
+
+                while not pc.describe_index(index_name).status['ready']:
+                    time.sleep(1)
+
+                print(f"Index '{index_name}' created successfully!")
+            except Exception as e:
+                print(f"Error creating index: {e}")
+                print(f"Please create the index '{index_name}' manually in the Pinecone console with dimension {dimension}.")
+
+        # Connect to the index
+        self.index = pc.Index(index_name)
+
+    def upsert(self, vectors: list, namespace: str):
+        self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def query(self, vector, namespace: str, top_k: int = 3, include_metadata: bool = True) -> dict:
+        results = self.index.query(
+            namespace=namespace,
+            vector=list(vector),
+            top_k=top_k,
+            include_metadata=include_metadata
+        )
+        return {
+            "matches": [
+                {"id": m["id"], "score": m["score"], "metadata": m.get("metadata") or {}}
+                for m in results["matches"]
+            ]
+        }
+
+    def fetch(self, ids: list, namespace: str) -> dict:
+        if not ids:
+            return {}
+        result = self.index.fetch(ids=list(ids), namespace=namespace)
+        return {
+            vector_id: {"id": vector_id, "values": list(v["values"]), "metadata": v.get("metadata") or {}}
+            for vector_id, v in result["vectors"].items()
+        }
+
+    def delete(self, ids: list, namespace: str):
+        # Pinecone caps ids per delete request
+        ids = list(ids)
+        for i in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[i:i + 1000], namespace=namespace)
+
+    def delete_namespace(self, namespace: str):
+        try:
+            self.index.delete(delete_all=True, namespace=namespace)
+        except Exception as e:
+            # Deleting a namespace that was never written is not an error here
+            if getattr(e, "status", None) != 404:
+                raise
+
+
+class _Namespace:
+    """
+    In-memory view of one on-disk namespace: header, row ids, metadata and the
+    memmap, plus how far into the rows log it has been read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.header = None
+        self.ids = []         # row -> id
+        self.metadata = []    # row -> metadata
+        self.rows = {}        # id -> row
+        self.deleted = set()  # rows whose id was deleted (reclaimed by compaction)
+        self.matrix = None    # lazily opened np.memmap
+        self.header_stamp = None
+        self.log_inode = None
+        self.log_offset = 0
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Offline backend. Each namespace is a directory holding:
+      - header.json   dimension, storage dtype and file generation
+      - vectors.bin   row-major matrix of L2-normalised vectors (memory-mapped)
+      - rows.jsonl    append-only log of {"row", "id", "metadata"} (or {"row", "id", "deleted"})
+    Cosine similarity is a dot product over normalised rows, computed in blocks with NumPy.
+    Several processes can share a directory: writers hold an flock on the
+    namespace, and every access checks the header and the rows log, replaying
+    new log lines (or reloading after a compaction) when another process
+    changed them. Once deleted rows pass LOCAL_VECTOR_COMPACT_RATIO of a
+    namespace, its live rows are rewritten into a new file generation.
+    """
+
+    def __init__(self, root: str = LOCAL_VECTOR_DIR, dtype: str = LOCAL_VECTOR_DTYPE,
+                 compact_ratio: float = LOCAL_VECTOR_COMPACT_RATIO):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported LOCAL_VECTOR_DTYPE '{dtype}'")
+        self.root = root
+        self.dtype = dtype
+        self.compact_ratio = compact_ratio
+        self._namespaces = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # ---- storage helpers ----
+
+    def _namespace_path(self, namespace: str) -> str:
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in namespace)
+        return os.path.join(self.root, safe)
+
+    def _get_namespace(self, namespace: str) -> _Namespace:
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                ns = self._namespaces[namespace] = _Namespace(self._namespace_path(namespace))
+            return ns
+
+    @staticmethod
+    def _files(ns: _Namespace, generation: int = None) -> tuple:
+        if generation is None:
+            generation = ns.header.get("generation", 0) if ns.header else 0
+        suffix = f".{generation}" if generation else ""
+        return os.path.join(ns.path, f"vectors{suffix}.bin"), os.path.join(ns.path, f"rows{suffix}.jsonl")
+
+    @contextmanager
+    def _write_lock(self, ns: _Namespace):
+        """
+        Serialises writers across processes (no-op where flock is unavailable).
+        """
+        os.makedirs(ns.path, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(ns.path, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self, ns: _Namespace):
+        """
+        Brings the in-memory view up to date with the files (caller holds ns.lock).
+        """
+        header_path = os.path.join(ns.path, "header.json")
+        try:
+            stat = os.stat(header_path)
+            header_stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            header_stamp = None
+
+        if header_stamp != ns.header_stamp:
+            # New, compacted or deleted namespace: start over
+            ns.reset()
+            if header_stamp is None:
+                return
+            with open(header_path, "r") as f:
+                ns.header = json.load(f)
+            ns.header_stamp = header_stamp
+
+        _, rows_path = self._files(ns)
+        try:
+            stat = os.stat(rows_path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != ns.log_inode or stat.st_size < ns.log_offset:
+            header, header_stamp = ns.header, ns.header_stamp
+            ns.reset()
+            ns.header, ns.header_stamp = header, header_stamp
+            ns.log_inode = stat.st_ino
+        if stat.st_size > ns.log_offset:
+            self._replay(ns, rows_path)
+
+    def _replay(self, ns: _Namespace, rows_path: str):
+        with open(rows_path, "rb") as f:
+            f.seek(ns.log_offset)
+            data = f.read()
+        # A line still being written by another process is picked up next time
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            if not line:
+                continue
+            entry = json.loads(line)
+            row = entry["row"]
+            while row >= len(ns.ids):
+                ns.ids.append(None)
+                ns.metadata.append({})
+            if entry.get("deleted"):
+                ns.ids[row] = None
+                ns.metadata[row] = {}
+                ns.rows.pop(entry["id"], None)
+                ns.deleted.add(row)
+                continue
+            ns.ids[row] = entry["id"]
+            ns.metadata[row] = entry.get("metadata") or {}
+            ns.rows[entry["id"]] = row
+            ns.deleted.discard(row)
+        ns.log_offset += complete
+        ns.matrix = None  # re-open on next query, rows were added
+
+    def _write_header(self, ns: _Namespace, header: dict):
+        header_path = os.path.join(ns.path, "header.json")
+        with open(f"{header_path}.tmp", "w") as f:
+            json.dump(header, f)
+        os.replace(f"{header_path}.tmp", header_path)
+
+    def _append_log(self, ns: _Namespace, log_lines: list):
+        _, rows_path = self._files(ns)
+        with open(rows_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(log_lines) + "\n")
+        # Our own lines are already applied in memory
+        stat = os.stat(rows_path)
+        ns.log_inode, ns.log_offset = stat.st_ino, stat.st_size
+
+    @staticmethod
+    def _encode(matrix: np.ndarray, dtype: str) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+        if dtype == "int8":
+            return np.clip(np.rint(matrix * 127.0), -127, 127).astype(np.int8)
+        return matrix.astype(dtype)
+
+    def _matrix(self, ns: _Namespace):
+        if ns.matrix is None or ns.matrix.shape[0] != len(ns.ids):
+            vectors_path, _ = self._files(ns)
+            ns.matrix = np.memmap(
+                vectors_path,
+                dtype=ns.header["dtype"],
+                mode="r",
+                shape=(len(ns.ids), ns.header["dimension"])
+            )
+        return ns.matrix
+
+    def _maybe_compact(self, ns: _Namespace):
+        """
+        Rewrites the live rows into the next file generation once deleted rows
+        pass `compact_ratio` of the namespace (caller holds both locks).
+        """
+        if not ns.deleted or len(ns.deleted) < self.compact_ratio * len(ns.ids):
+            return
+        live = [row for row, vector_id in enumerate(ns.ids) if vector_id is not None]
+        generation = ns.header.get("generation", 0) + 1
+        old_vectors, old_rows = self._files(ns)
+        new_vectors, new_rows = self._files(ns, generation)
+
+        matrix = self._matrix(ns) if ns.ids else None
+        with open(new_vectors, "wb") as f:
+            for start in range(0, len(live), SEARCH_BLOCK_ROWS):
+                f.write(np.ascontiguousarray(matrix[live[start:start + SEARCH_BLOCK_ROWS]]).tobytes())
+        with open(new_rows, "w", encoding="utf-8") as f:
+            for new_row, row in enumerate(live):
+                f.write(json.dumps({"row": new_row, "id": ns.ids[row], "metadata": ns.metadata[row]}) + "\n")
+
+        # The header names the live generation, so readers switch in one step
+        self._write_header(ns, {**ns.header, "generation": generation})
+        ns.matrix = None
+        for path in (old_vectors, old_rows):
+            if os.path.exists(path):
+                os.remove(path)
+        self._refresh(ns)
+
+    # ---- VectorStore API ----
+
+    def upsert(self, vectors: list, namespace: str):
+        if not vectors:
+            return
+        ns = self._get_namespace(namespace)
+        values = np.asarray([v["values"] for v in vectors], dtype=np.float32)
+
+        with ns.lock, self._write_lock(ns):
+            self._refresh(ns)
+            if ns.header is None:
+                self._write_header(ns, {"dimension": values.shape[1], "dtype": self.dtype})
+                self._refresh(ns)
+            header = ns.header
+            if values.shape[1] != header["dimension"]:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match namespace dimension {header['dimension']}")
+            encoded = self._encode(values, header["dtype"])
+            row_bytes = encoded.itemsize * header["dimension"]
+
+            vectors_path, _ = self._files(ns)
+            with open(vectors_path, "ab"):
+                pass  # make sure the file exists before opening it for update
+            log_lines = []
+            with open(vectors_path, "r+b") as f:
+                for vector, row_values in zip(vectors, encoded):
+                    row = ns.rows.get(vector["id"])
+                    if row is None:
+                        row = len(ns.ids)
+                        ns.ids.append(vector["id"])
+                        ns.metadata.append(vector.get("metadata") or {})
+                        ns.rows[vector["id"]] = row
+                    else:
+                        ns.metadata[row] = vector.get("metadata") or {}
+                    f.seek(row * row_bytes)
+                    f.write(row_values.tobytes())
+                    log_lines.append(json.dumps({"row": row, "id": vector["id"], "metadata": vector.get("metadata") or {}}))
+
+            self._append_log(ns, log_lines)
+            ns.matrix = None  # re-open on next query, the file changed
+
+    def query(self, vector, namespace: str, top_k: int = 3, include_metadata: bool = True) -> dict:
+        ns = self._get_namespace(namespace)
+        with ns.lock:
+            self._refresh(ns)
+            if ns.header is None or not ns.ids:
+                return {"matches": []}
+            header = ns.header
+            matrix = self._matrix(ns)
+            ids = ns.ids
+            metadata = ns.metadata
+            deleted = list(ns.deleted)
+
+        query_vec = np.asarray(vector, dtype=np.float32)
+        query_vec = query_vec / max(float(np.linalg.norm(query_vec)), 1e-12)
+        scale = 1.0 / 127.0 if header["dtype"] == "int8" else 1.0
+
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], SEARCH_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + block.shape[0]] = block @ query_vec
+        scores *= scale
+        if deleted:
+            scores[deleted] = -np.inf
+
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = [row for row in top if np.isfinite(scores[row])]
+
+        return {
+            "matches": [
+                {
+                    "id": ids[row],
+                    "score": float(scores[row]),
+                    "metadata": metadata[row] if include_metadata else {}
+                }
+                for row in top
+            ]
+        }
+
+    def fetch(self, ids: list, namespace: str) -> dict:
+        ns = self._get_namespace(namespace)
+        with ns.lock:
+            self._refresh(ns)
+            if ns.header is None or not ns.ids:
+                return {}
+            header = ns.header
+            matrix = self._matrix(ns)
+            rows = {vector_id: ns.rows[vector_id] for vector_id in ids if vector_id in ns.rows}
+            metadata = {vector_id: ns.metadata[row] for vector_id, row in rows.items()}
+
+        scale = 1.0 / 127.0 if header["dtype"] == "int8" else 1.0
+        return {
+            vector_id: {
+                "id": vector_id,
+                "values": (np.asarray(matrix[row], dtype=np.float32) * scale).tolist(),
+                "metadata": metadata[vector_id]
+            }
+            for vector_id, row in rows.items()
+        }
+
+    def delete(self, ids: list, namespace: str):
+        ns = self._get_namespace(namespace)
+        if not os.path.isdir(ns.path):
+            return
+        with ns.lock, self._write_lock(ns):
+            self._refresh(ns)
+            log_lines = []
+            for vector_id in ids:
+                row = ns.rows.pop(vector_id, None)
+                if row is None:
+                    continue
+                ns.ids[row] = None
+                ns.metadata[row] = {}
+                ns.deleted.add(row)
+                log_lines.append(json.dumps({"row": row, "id": vector_id, "deleted": True}))
+
+            if log_lines:
+                self._append_log(ns, log_lines)
+                self._maybe_compact(ns)
+
+    def delete_namespace(self, namespace: str):
+        ns = self._get_namespace(namespace)
+        with ns.lock:
+            if os.path.isdir(ns.path):
+                with self._write_lock(ns):
+                    shutil.rmtree(ns.path)
+            ns.reset()
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+
+
+def get_vector_store(dimension: int = EMBEDDING_DIM) -> VectorStore:
+    """
+    Builds the backend selected by the VECTOR_STORE environment variable.
+    `dimension` is only used to create a missing Pinecone index; local
+    namespaces record the dimension of their first vectors.
+    """
+    if VECTOR_STORE == "local":
+        print(f"Using local vector store at '{LOCAL_VECTOR_DIR}' ({LOCAL_VECTOR_DTYPE})")
+        return LocalVectorStore()
+    if VECTOR_STORE == "pinecone":
+        return PineconeVectorStore(dimension=dimension)
+    raise ValueError(f"Unknown VECTOR_STORE '{VECTOR_STORE}' (expected 'pinecone' or 'local')")
@@ -0,0 +1,20 @@
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+# Services read their configuration (and create their directories) at import,
+# so point everything at a scratch directory before any of them is imported
+_work = tempfile.mkdtemp(prefix="mentormind-tests-")
+atexit.register(shutil.rmtree, _work, ignore_errors=True)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_work, 'test.db')}")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("VECTOR_STORE", "local")
+os.environ.setdefault("LOCAL_VECTOR_DIR", os.path.join(_work, "vector_store"))
+os.environ.setdefault("CHUNK_STORE_DIR", os.path.join(_work, "chunk_store"))
+os.environ.setdefault("BM25_DIR", os.path.join(_work, "bm25_index"))
+os.environ.setdefault("EMBED_CACHE_ENABLED", "0")
+os.environ.setdefault("LLM_RATE_LIMIT_ENABLED", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
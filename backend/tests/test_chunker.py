@@ -0,0 +1,30 @@
+from services.chunker import chunk_text, split_sentences
+from services.token_utils import count_tokens
+
+
+TEXT = " ".join(f"Sentence number {i} talks about voltage and current." for i in range(40))
+
+
+def test_chunks_stay_within_the_target():
+    chunks = chunk_text(TEXT, target_tokens=40, overlap_tokens=15)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 40 for chunk in chunks)
+
+
+def test_consecutive_chunks_overlap_by_whole_sentences():
+    chunks = chunk_text(TEXT, target_tokens=40, overlap_tokens=15)
+    for previous, current in zip(chunks, chunks[1:]):
+        first_sentence = split_sentences(current)[0]
+        assert first_sentence in split_sentences(previous)
+
+
+def test_no_overlap_when_disabled():
+    chunks = chunk_text(TEXT, target_tokens=40, overlap_tokens=0)
+    sentences = [sentence for chunk in chunks for sentence in split_sentences(chunk)]
+    assert sentences == split_sentences(TEXT)
+
+
+def test_run_on_text_is_split():
+    chunks = chunk_text("word " * 500, target_tokens=50, overlap_tokens=10)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 50 for chunk in chunks)
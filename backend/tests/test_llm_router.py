@@ -0,0 +1,106 @@
+import asyncio
+import types
+import pytest
+from services import llm_provider
+from services.llm_provider import LLMRouter, ProviderUnavailable, BREAKER_OPEN, BREAKER_CLOSED
+
+
+def fake_module(answer=None, error=None, delay=0.0):
+    """
+    Stands in for a services/*_service.py module; records every prompt it gets.
+    """
+    module = types.SimpleNamespace(prompts=[])
+
+    async def ask_quick_tutor(question):
+        module.prompts.append(question)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return answer
+
+    module.ask_quick_tutor = ask_quick_tutor
+    return module
+
+
+def make_router(*modules):
+    router = LLMRouter(["groq", "gemini", "ollama"][:len(modules)])
+    for provider, module in zip(router.providers, modules):
+        provider._module = module
+    return router
+
+
+def test_fails_over_to_the_next_provider():
+    primary = fake_module(error=RuntimeError("503 from upstream"))
+    secondary = fake_module(answer="from gemini")
+    router = make_router(primary, secondary)
+
+    assert asyncio.run(router.ask_quick_tutor("What is Ohm's law?")) == "from gemini"
+    assert primary.prompts == secondary.prompts == ["What is Ohm's law?"]
+    assert router.failovers == 1
+
+
+def test_all_providers_failing_raises():
+    router = make_router(fake_module(error=RuntimeError("down")), fake_module(error=RuntimeError("down")))
+
+    with pytest.raises(ProviderUnavailable):
+        asyncio.run(router.ask_quick_tutor("question"))
+
+
+def test_circuit_opens_and_skips_the_provider(monkeypatch):
+    monkeypatch.setattr(llm_provider, "LLM_BREAKER_MIN_CALLS", 3)
+    monkeypatch.setattr(llm_provider, "LLM_BREAKER_COOLDOWN", 60)
+    primary = fake_module(error=RuntimeError("down"))
+    secondary = fake_module(answer="ok")
+    router = make_router(primary, secondary)
+
+    async def run():
+        for i in range(3):
+            await router.ask_quick_tutor(f"question {i}")
+        assert router.health["groq"].state == BREAKER_OPEN
+        assert router.name == "gemini"
+        return await router.ask_quick_tutor("question 3")
+
+    assert asyncio.run(run()) == "ok"
+    # The open circuit kept the last call away from the failing provider
+    assert len(primary.prompts) == 3
+    assert len(secondary.prompts) == 4
+
+
+def test_half_open_trial_closes_the_circuit(monkeypatch):
+    monkeypatch.setattr(llm_provider, "LLM_BREAKER_MIN_CALLS", 1)
+    monkeypatch.setattr(llm_provider, "LLM_BREAKER_COOLDOWN", 0)
+    primary = fake_module(error=RuntimeError("down"))
+    router = make_router(primary, fake_module(answer="fallback"))
+
+    async def run():
+        await router.ask_quick_tutor("first")
+        assert router.health["groq"].state == BREAKER_OPEN
+        primary.ask_quick_tutor = fake_module(answer="recovered").ask_quick_tutor
+        return await router.ask_quick_tutor("second")
+
+    assert asyncio.run(run()) == "recovered"
+    assert router.health["groq"].state == BREAKER_CLOSED
+
+
+def test_unavailable_provider_is_disabled():
+    # Raised when a provider's SDK or API key is missing
+    router = make_router(fake_module(error=ProviderUnavailable("groq SDK is not installed")), fake_module(answer="ok"))
+
+    assert asyncio.run(router.ask_quick_tutor("question")) == "ok"
+    assert router.health["groq"].disabled
+    assert router.name == "gemini"
+
+
+def test_identical_concurrent_calls_are_coalesced():
+    primary = fake_module(answer="shared", delay=0.05)
+    router = make_router(primary)
+
+    async def run():
+        return await asyncio.gather(
+            router.ask_quick_tutor("What is  Ohm's law?"),
+            router.ask_quick_tutor("what is ohm's law?"),
+            router.ask_quick_tutor("WHAT IS OHM'S LAW?"),
+        )
+
+    assert asyncio.run(run()) == ["shared"] * 3
+    assert len(primary.prompts) == 1
@@ -0,0 +1,87 @@
+import hashlib
+import numpy as np
+import pytest
+from services import rag_service, bm25_index
+from services.chunk_store import get_chunk_store, delete_namespace
+from services.vector_store import LocalVectorStore
+
+
+class FakeEncoder:
+    """
+    Deterministic 8-dimensional embeddings; counts the texts it encodes.
+    """
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32):
+        self.encoded.extend(texts)
+        return np.array([
+            np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest()[:8], dtype=np.uint8).astype(np.float32) + 1
+            for text in texts
+        ])
+
+
+def page(number: int, sentences: int = 3, edit: str = "") -> str:
+    return " ".join(f"Page {number} sentence {i} about Ohm's law{edit}." for i in range(sentences))
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    encoder = FakeEncoder()
+    store = LocalVectorStore(str(tmp_path / "vectors"))
+    monkeypatch.setattr(rag_service, "embed_model", encoder)
+    monkeypatch.setattr(rag_service, "vector_store", store)
+
+    def run(pages, previous_pages=None):
+        monkeypatch.setattr(rag_service, "iter_pages", lambda file_path, stats=None: iter(pages))
+        encoder.encoded.clear()
+        return rag_service.process_pdf("unused.pdf", "test_incremental", previous_pages=previous_pages)
+
+    run.encoder = encoder
+    run.store = store
+    yield run
+    store.delete_namespace("test_incremental")
+    delete_namespace("test_incremental")
+    bm25_index.delete_index("test_incremental")
+
+
+def vector_ids(store) -> set:
+    return {match["id"] for match in store.query([1.0] * 8, "test_incremental", top_k=1000)["matches"]}
+
+
+def test_only_changed_pages_are_embedded(ingest):
+    first = ingest([page(1), page(2), page(3)])
+    assert first["pages_changed"] == 3
+    assert vector_ids(ingest.store) == {"p1_c0", "p2_c0", "p3_c0"}
+
+    second = ingest([page(1), page(2, edit=" (revised)"), page(3)], previous_pages=first["page_hashes"])
+    assert second["pages_changed"] == 1
+    assert second["chunks_embedded"] == 1
+    assert ingest.encoder.encoded == [page(2, edit=" (revised)")]
+    assert second["page_hashes"][0] == first["page_hashes"][0]
+    assert second["page_hashes"][1] != first["page_hashes"][1]
+
+    store = get_chunk_store("test_incremental")
+    assert store.get("p2_c0") == page(2, edit=" (revised)")
+    assert store.get("p1_c0") == page(1)
+
+
+def test_removed_pages_and_chunks_are_deleted(ingest, monkeypatch):
+    monkeypatch.setattr(rag_service, "chunk_page", lambda text: text.strip().split(". "))
+    first = ingest([page(1), page(2), page(3)])
+    assert first["chunks"] == 9
+
+    # Page 2 loses a sentence, page 3 is gone
+    second = ingest([page(1), page(2, sentences=2)], previous_pages=first["page_hashes"])
+    assert second["pages_changed"] == 1
+    assert second["chunks_deleted"] == 4
+    assert vector_ids(ingest.store) == {"p1_c0", "p1_c1", "p1_c2", "p2_c0", "p2_c1"}
+
+
+def test_unchanged_document_embeds_nothing(ingest):
+    first = ingest([page(1), page(2)])
+    second = ingest([page(1), page(2)], previous_pages=first["page_hashes"])
+    assert second["pages_changed"] == 0
+    assert ingest.encoder.encoded == []
+    assert vector_ids(ingest.store) == {"p1_c0", "p2_c0"}
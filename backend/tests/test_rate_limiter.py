@@ -0,0 +1,52 @@
+import asyncio
+import time
+import pytest
+from services import rate_limiter
+from services.rate_limiter import TokenBucket, ProviderRateLimiter, RateLimitExceeded, parse_duration
+
+
+def test_bucket_refills_at_its_per_minute_rate():
+    bucket = TokenBucket(60)  # one unit per second
+    now = bucket.updated
+    bucket.take(60)
+    assert bucket.wait_for(1, now) == pytest.approx(1.0)
+    assert bucket.wait_for(1, now + 0.5) == pytest.approx(0.5)
+    assert bucket.wait_for(1, now + 1) == 0.0
+
+
+def test_deficit_queues_callers_in_order():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    bucket.take(60)
+    waits = []
+    for _ in range(3):
+        waits.append(bucket.wait_for(1, now))
+        bucket.take(1)
+    assert waits == pytest.approx([1.0, 2.0, 3.0])
+
+
+def test_given_back_units_and_resize_cap_the_level():
+    bucket = TokenBucket(10)
+    now = bucket.updated
+    bucket.take(4)
+    bucket.give_back(100)
+    assert bucket.level == 10
+    bucket.resize(5, now)
+    assert bucket.capacity == 5 and bucket.level == 5
+
+
+def test_requests_past_the_deadline_are_shed(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_ENABLED", True)
+    limiter = ProviderRateLimiter("test", rpm=60, tpm=0)
+    limiter.requests.take(60)
+    with pytest.raises(RateLimitExceeded) as raised:
+        asyncio.run(limiter.acquire(10, deadline=time.monotonic() + 0.1))
+    assert raised.value.retry_after == pytest.approx(1.0, abs=0.05)
+    assert limiter.shed == 1
+
+
+def test_parse_duration():
+    assert parse_duration("1m30s") == 90
+    assert parse_duration("250ms") == 0.25
+    assert parse_duration("7.5") == 7.5
+    assert parse_duration("soon") is None
@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from core.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"answer": 42}
+
+    async def run():
+        return await asyncio.gather(*(flight.do(("op", "key"), upstream) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats()["coalesced"] == 4
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_finished_call_is_not_reused():
+    flight = SingleFlight()
+    calls = 0
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def run():
+        return [await flight.do(("op", "key"), upstream) for _ in range(2)]
+
+    assert asyncio.run(run()) == [1, 2]
+
+
+def test_error_reaches_every_caller():
+    flight = SingleFlight()
+
+    async def upstream():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    async def run():
+        return await asyncio.gather(*(flight.do(("op", "key"), upstream) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_upstream_is_cancelled_only_when_every_caller_leaves():
+    flight = SingleFlight()
+
+    async def run():
+        gate = asyncio.Event()
+        state = {"cancelled": False}
+
+        async def upstream():
+            try:
+                await gate.wait()
+                return "done"
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        first = asyncio.ensure_future(flight.do(("op", "key"), upstream))
+        second = asyncio.ensure_future(flight.do(("op", "key"), upstream))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        assert not state["cancelled"]
+        gate.set()
+        assert await second == "done"
+
+        third = asyncio.ensure_future(flight.do(("op", "other"), upstream))
+        gate.clear()
+        await asyncio.sleep(0)
+        third.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await third
+        await asyncio.sleep(0)
+        return state["cancelled"]
+
+    assert asyncio.run(run())
+
+
+def test_late_stream_joiner_gets_every_chunk():
+    flight = SingleFlight()
+    calls = 0
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        for chunk in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield chunk
+
+    async def consume(delay):
+        await asyncio.sleep(delay)
+        return [chunk async for chunk in flight.stream(("stream", "key"), upstream)]
+
+    async def run():
+        return await asyncio.gather(consume(0), consume(0.015))
+
+    assert asyncio.run(run()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert calls == 1
@@ -1,9 +1,14 @@
 import streamlit as st
 from streamlit_mic_recorder import speech_to_text
-from utils import api_call
+from utils import api_call, api_stream, stream_answer
 import speech_recognition as sr
 import base64
 import io
+import time
+
+# Waiting for a quiz that is still being generated
+QUIZ_POLL_INTERVAL_SECONDS = 2
+QUIZ_MAX_WAIT_SECONDS = 90
 
 def transcribe_audio(audio_bytes):
     r = sr.Recognizer()
@@ -21,6 +26,22 @@ def transcribe_audio(audio_bytes):
     except Exception as e:
         return f"Error: {e}"
 
+def wait_for_quiz(response_id):
+    """
+    Polls the quiz of a tutor answer until it is generated; returns its final
+    status ("ready" or "failed", with the error) or None on timeout.
+    """
+    deadline = time.monotonic() + QUIZ_MAX_WAIT_SECONDS
+    while True:
+        quiz = api_call(f"/quiz/{response_id}")
+        if quiz is None:
+            return None, None
+        if quiz.get("status", "ready") != "pending":
+            return quiz.get("status", "ready"), quiz.get("error")
+        if time.monotonic() >= deadline:
+            return None, None
+        time.sleep(QUIZ_POLL_INTERVAL_SECONDS)
+
 def show_ask():
     #Navigation
     if st.button("← Back to Dashboard"):
@@ -47,13 +68,13 @@ def show_ask():
             submitted = st.form_submit_button("Ask Tutor", type="primary")
 
         if submitted and text_input:
-            with st.spinner("Analyzing and generating quiz..."):
-                # Call /ask-tutor
-                data = api_call("/ask-tutor", "POST", {"question": text_input})
-                
-                if data:
-                    st.session_state.ask_response = data
-                    st.rerun() 
+            # Stream /ask-tutor: the answer renders as it is written, the quiz is generated afterwards
+            st.divider()
+            data = stream_answer(api_stream("/ask-tutor/stream", {"question": text_input}), st.empty())
+            
+            if data:
+                st.session_state.ask_response = data
+                st.rerun() 
 
         # Display Results
         if 'ask_response' in st.session_state and st.session_state.ask_response.get('type') != 'quick':
@@ -67,13 +88,27 @@ def show_ask():
             
             st.divider()
             
+            if data.get("quiz_status") == "pending":
+                st.caption("⏳ Your quiz is being generated in the background.")
+
             col1, col2 = st.columns([1, 2])
             with col1:
                 if st.button("📝 Take Generated Quiz", type="primary", use_container_width=True):
                     if data.get("response_id"):
-                        st.session_state.current_quiz_id = data["response_id"]
-                        st.session_state.page = "quiz"
-                        st.rerun()
+                        quiz_status, quiz_error = "ready", None
+                        if data.get("quiz_status") == "pending":
+                            with st.spinner("Finishing your quiz..."):
+                                quiz_status, quiz_error = wait_for_quiz(data["response_id"])
+
+                        if quiz_status == "ready":
+                            data["quiz_status"] = "ready"
+                            st.session_state.current_quiz_id = data["response_id"]
+                            st.session_state.page = "quiz"
+                            st.rerun()
+                        elif quiz_status == "failed":
+                            st.error(f"Quiz generation failed: {quiz_error or 'Unknown error'}")
+                        else:
+                            st.warning("The quiz is taking longer than usual. Please try again in a moment.")
                     else:
                         st.error("No Quiz ID returned from backend.")
             
@@ -104,13 +139,14 @@ def show_ask():
             if text_query:
                 st.success(f"You said: '{text_query}'")
                 
-                # Send Text to Backend
-                with st.spinner("Thinking..."):
-                    data = api_call("/ask-quick", "POST", {"question": text_query})
-                    
-                    if data:
-                        st.session_state.voice_response = data
-                        # st.rerun()
+                # Send Text to Backend (streamed; audio arrives with the last event)
+                placeholder = st.empty()
+                data = stream_answer(api_stream("/ask-quick/stream", {"question": text_query}), placeholder)
+                placeholder.empty()  # shown again below with its audio
+                
+                if data:
+                    st.session_state.voice_response = data
+                    # st.rerun()
             else:
                 st.error("Could not understand audio. Please try again.")
 
@@ -1,5 +1,29 @@
+import time
 import streamlit as st
-from utils import api_call
+from utils import api_call, api_stream, stream_answer
+
+POLL_INTERVAL_SECONDS = 2
+
+def show_ingestion_status(pdf):
+    """
+    Shows progress for a PDF that is still being processed in the background.
+    """
+    status = api_call(f"/pdf/status/{pdf['id']}")
+    if not status:
+        return False
+
+    if status["status"] == "failed":
+        st.error(f"❌ {pdf['filename']}: {status.get('error') or 'Processing failed'}")
+        return False
+
+    pages_total = status.get("pages_total") or 0
+    pages_done = status.get("pages_processed") or 0
+    progress = min(pages_done / pages_total, 1.0) if pages_total else 0.0
+    st.progress(
+        progress,
+        text=f"⏳ {pdf['filename']}: {status['status']} ({pages_done}/{pages_total or '?'} pages, {status.get('chunks_processed', 0)} chunks)"
+    )
+    return True
 
 def show_pdf_chat():
     if st.button("← Back"):
@@ -12,22 +36,30 @@ def show_pdf_chat():
     with st.sidebar:
         st.header("My Documents")
         uploaded_file = st.file_uploader("Upload New PDF", type="pdf")
+        replace = st.checkbox("Replace my existing file with the same name", help="Only the pages that changed are re-processed.")
         
         if uploaded_file and st.button("Process PDF"):
-            with st.spinner("Uploading & Embedding..."):
+            with st.spinner("Uploading..."):
                 files = {"file": (uploaded_file.name, uploaded_file, "application/pdf")}
-                res = api_call("/pdf/upload", "POST", files=files)
+                endpoint = "/pdf/upload?mode=replace" if replace else "/pdf/upload"
+                res = api_call(endpoint, "POST", files=files)
                 if res:
-                    st.success("PDF Processed!")
+                    st.success("PDF uploaded! Processing in the background...")
                     st.rerun() # Refresh list
 
         st.divider()
         st.write("Select a file to chat:")
         pdfs = api_call("/pdf/list")
+        in_progress = False
         if pdfs:
+            if st.button("📚 Search all my documents", key="library"):
+                st.session_state.selected_pdf = {"id": None, "filename": "All my documents", "library": True}
             for pdf in pdfs:
-                if st.button(f"📄 {pdf['filename']}", key=pdf['id']):
-                    st.session_state.selected_pdf = pdf
+                if pdf.get("status", "indexed") == "indexed":
+                    if st.button(f"📄 {pdf['filename']}", key=pdf['id']):
+                        st.session_state.selected_pdf = pdf
+                else:
+                    in_progress = show_ingestion_status(pdf) or in_progress
 
     # Chat Area
     if "selected_pdf" in st.session_state:
@@ -52,11 +84,34 @@ def show_pdf_chat():
 
             # Get AI Response
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    res = api_call("/pdf/chat", "POST", {"pdf_id": pdf['id'], "question": prompt})
-                    if res:
-                        ai_msg = res["answer"]
-                        st.markdown(ai_msg)
-                        st.session_state.pdf_messages.append({"role": "assistant", "content": ai_msg})
+                placeholder = st.empty()
+                if pdf.get("library"):
+                    with st.spinner("Thinking..."):
+                        res = api_call("/pdf/library/chat", "POST", {"question": prompt})
+                else:
+                    # Answer renders token by token; citations come with the final event
+                    res = stream_answer(api_stream("/pdf/chat/stream", {"pdf_id": pdf['id'], "question": prompt}), placeholder)
+                if res:
+                    ai_msg = res["answer"]
+                    if pdf.get("library"):
+                        sources = {}
+                        for c in res.get("citations", []):
+                            sources.setdefault(c["filename"], set()).add(c.get("page"))
+                        if sources:
+                            ai_msg += "\n\n*Sources: " + "; ".join(
+                                f"{name} (page {', '.join(str(p) for p in sorted(p for p in found if p))})"
+                                for name, found in sources.items()
+                            ) + "*"
+                    else:
+                        pages = sorted({c["page"] for c in res.get("citations", []) if c.get("page")})
+                        if pages:
+                            ai_msg += f"\n\n*Sources: page {', '.join(str(p) for p in pages)}*"
+                    placeholder.markdown(ai_msg)
+                    st.session_state.pdf_messages.append({"role": "assistant", "content": ai_msg})
     else:
-        st.info("Please select or upload a PDF from the sidebar.")
\ No newline at end of file
+        st.info("Please select or upload a PDF from the sidebar.")
+
+    # Keep polling while any upload is still being processed
+    if in_progress:
+        time.sleep(POLL_INTERVAL_SECONDS)
+        st.rerun()
\ No newline at end of file
@@ -16,6 +16,13 @@ def show_quiz():
     if "quiz_data" not in st.session_state or st.session_state.quiz_id_ref != response_id:
         with st.spinner("Loading Quiz..."):
             data = api_call(f"/quiz/{response_id}")
+            if data and data.get("status", "ready") != "ready":
+                # Still being generated (or failed): nothing to take yet
+                if data["status"] == "failed":
+                    st.error(f"Quiz generation failed: {data.get('error') or 'Unknown error'}")
+                else:
+                    st.info("This quiz is still being generated. Please check back in a moment.")
+                return
             if data:
                 # Fetch details for each question
                 questions = []
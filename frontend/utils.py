@@ -1,4 +1,5 @@
 import os
+import json
 import requests
 import streamlit as st
 
@@ -36,4 +37,50 @@ def api_call(endpoint, method="GET", payload=None, files=None):
         return response.json()
     except Exception as e:
         st.error(f"Connection Error: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def api_stream(endpoint, payload=None):
+    """
+    POSTs to an NDJSON streaming endpoint and yields its events as dicts
+    ({"type": "token" | "done" | "error", ...}) as they arrive.
+    """
+    token = st.session_state.get("token")
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+    try:
+        with requests.post(f"{API_BASE}{endpoint}", json=payload, headers=headers, stream=True) as response:
+            if response.status_code == 401:
+                st.error("Session expired. Please login again.")
+                st.session_state.clear()
+                st.rerun()
+                return
+
+            if response.status_code >= 400:
+                st.error(f"Error: {response.json().get('detail', 'Unknown error')}")
+                return
+
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "error":
+                    st.error(f"Error: {event.get('detail', 'Unknown error')}")
+                    return
+                yield event
+    except Exception as e:
+        st.error(f"Connection Error: {e}")
+
+def stream_answer(events, placeholder):
+    """
+    Renders streamed tokens into a Streamlit placeholder as they arrive and
+    returns the final "done" event (None if the stream failed).
+    """
+    text = ""
+    for event in events:
+        if event["type"] == "token":
+            text += event["text"]
+            placeholder.markdown(text + "▌")
+        elif event["type"] == "done":
+            placeholder.markdown(event.get("answer", text))
+            return event
+    return None